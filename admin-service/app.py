@@ -1,32 +1,60 @@
 from flask import Flask, Response, request
 import requests
+from requests.adapters import HTTPAdapter
 from prometheus_flask_exporter import PrometheusMetrics
 import os
+import json
 
 app = Flask(__name__)
 metrics = PrometheusMetrics(app)
 CATALOG_SERVICE_URL = os.environ.get("CATALOG_SERVICE_URL", "http://catalog-service:5000")
 
+# One keep-alive pool to the catalog shared by all requests, with explicit timeouts
+PROXY_POOL_SIZE = int(os.environ.get("PROXY_POOL_SIZE", "20"))
+PROXY_TIMEOUT = (float(os.environ.get("PROXY_CONNECT_TIMEOUT", "2")), float(os.environ.get("PROXY_READ_TIMEOUT", "30")))
+PROXY_CHUNK_SIZE = 64 * 1024
+# Headers that describe the connection to the catalog, not the response
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailers",
+                      "transfer-encoding", "upgrade"}
+
+catalog_http = requests.Session()
+catalog_http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=PROXY_POOL_SIZE))
+catalog_http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=PROXY_POOL_SIZE))
+
+def error_response(message, status):
+    return Response(json.dumps({"error": message}), status=status, content_type='application/json')
+
+def relay(method, url, **kwargs):
+    """Forward a request to the catalog-service and stream its response back unchanged"""
+    try:
+        upstream = catalog_http.request(method, url, stream=True, timeout=PROXY_TIMEOUT, **kwargs)
+    except requests.exceptions.Timeout as e:
+        return error_response(str(e), 504)
+    except requests.exceptions.ConnectionError as e:
+        return error_response(str(e), 502)
+    except Exception as e:
+        return error_response(str(e), 500)
+    
+    headers = [(k, v) for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS]
+    # Raw bytes (still compressed if they were), so Content-Length and Content-Encoding stay valid
+    body = upstream.raw.stream(PROXY_CHUNK_SIZE, decode_content=False)
+    response = Response(body, status=upstream.status_code, headers=headers)
+    # Returns the connection to the pool, also when the client goes away mid-response
+    response.call_on_close(upstream.close)
+    return response
+
 @app.route("/videos", methods=['GET', 'POST'])
 def handle_videos_collection():
     """Handle listing all videos and adding a new one."""
     if request.method == 'POST':
-        try:
-            video_data = request.get_json()
-            if not video_data:
-                return Response('{"error": "Invalid JSON"}', status=400, content_type='application/json')
-            # Forward the POST request to the catalog-service
-            r = requests.post(f"{CATALOG_SERVICE_URL}/videos", json=video_data)
-            return Response(r.content, status=r.status_code, content_type=r.headers['content-type'])
-        except Exception as e:
-            return Response(f'{{"error": "{str(e)}"}}', status=500, content_type='application/json')
+        video_data = request.get_json(silent=True)
+        if not video_data:
+            return error_response("Invalid JSON", 400)
+        # Forward the POST request to the catalog-service
+        return relay('POST', f"{CATALOG_SERVICE_URL}/videos", json=video_data)
     
     # Handle GET request (listing)
-    try:
-        r = requests.get(f"{CATALOG_SERVICE_URL}/videos")
-        return Response(r.content, status=r.status_code, content_type='application/json')
-    except Exception as e:
-        return Response(f'{{"error": "{str(e)}"}}', status=500, content_type='application/json')
+    return relay('GET', f"{CATALOG_SERVICE_URL}/videos", params=request.args)
 
 @app.route("/videos/<video_id>", methods=['PUT', 'DELETE'])
 def handle_specific_video(video_id):
@@ -34,23 +62,14 @@ def handle_specific_video(video_id):
     video_specific_url = f"{CATALOG_SERVICE_URL}/videos/{video_id}"
 
     if request.method == 'PUT':
-        try:
-            video_data = request.get_json()
-            if not video_data:
-                return Response('{"error": "Invalid JSON"}', status=400, content_type='application/json')
-            # Forward the PUT request to the catalog-service
-            r = requests.put(video_specific_url, json=video_data)
-            return Response(r.content, status=r.status_code, content_type=r.headers['content-type'])
-        except Exception as e:
-            return Response(f'{{"error": "{str(e)}"}}', status=500, content_type='application/json')
-
-    if request.method == 'DELETE':
-        try:
-            # Forward the DELETE request to the catalog-service
-            r = requests.delete(video_specific_url)
-            return Response(r.content, status=r.status_code, content_type=r.headers['content-type'])
-        except Exception as e:
-            return Response(f'{{"error": "{str(e)}"}}', status=500, content_type='application/json')
+        video_data = request.get_json(silent=True)
+        if not video_data:
+            return error_response("Invalid JSON", 400)
+        # Forward the PUT request to the catalog-service
+        return relay('PUT', video_specific_url, json=video_data)
+
+    # Forward the DELETE request to the catalog-service
+    return relay('DELETE', video_specific_url)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -1,13 +1,20 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from prometheus_flask_exporter import PrometheusMetrics
-from pymongo import MongoClient, ReadPreference, WriteConcern
+from pymongo import MongoClient, ReadPreference, WriteConcern, ReturnDocument, UpdateOne
 from pymongo.read_concern import ReadConcern
+from pymongo.errors import DuplicateKeyError, BulkWriteError, OperationFailure
 from bson import ObjectId
+from concurrent.futures import ThreadPoolExecutor
 import os
+import socket
 import logging
 import time
 import json
+import threading
+import hashlib
+from bloom import CountingBloomFilter
+from snapshot import CatalogSnapshot
 
 app = Flask(__name__)
 metrics = PrometheusMetrics(app)
@@ -20,6 +27,9 @@ logger = logging.getLogger(__name__)
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://mongo_primary:27017/ualflix")
 USE_NATIVE_REPLICA_SET = "replicaSet=" in MONGO_URI
 
+# Largest batch accepted by the bulk view endpoint
+MAX_VIEW_BATCH = int(os.environ.get("MAX_VIEW_BATCH", "1000"))
+
 # Initialize based on implementation type
 if USE_NATIVE_REPLICA_SET:
     logger.info("Using MongoDB Native Replica Set implementation")
@@ -48,6 +58,47 @@ if USE_NATIVE_REPLICA_SET:
     CACHE_TTL = 3600
     POPULAR_VIDEOS_KEY = "popular_videos"
     
+    # Cached list query results, invalidated by dependency tags
+    QUERY_CACHE_TTL = int(os.environ.get("QUERY_CACHE_TTL", "30"))
+    QUERY_CACHE_PREFIX = "query:"
+    QUERY_TAG_PREFIX = "query_tag:"
+    QUERY_TAGS_KEY = "query_tags"
+    
+    # Negative cache for IDs that are known not to exist
+    NEGATIVE_CACHE_TTL = int(os.environ.get("NEGATIVE_CACHE_TTL", "30"))
+    MISSING_VIDEO_PREFIX = "video:missing:"
+    
+    # Fields kept on video documents for the service itself, never returned or cached
+    PUBLIC_PROJECTION = {"idempotency_key": 0}
+    
+    # Optional in-memory Bloom filter of existing video IDs
+    BLOOM_FILTER_ENABLED = os.environ.get("BLOOM_FILTER_ENABLED", "false").lower() == "true"
+    BLOOM_REBUILD_INTERVAL = int(os.environ.get("BLOOM_REBUILD_INTERVAL", "300"))
+    BLOOM_CLOCK_SKEW = 60  # seconds of tolerance for ObjectIds generated on other hosts
+    # Share of deleted IDs after which the filter is rebuilt before BLOOM_REBUILD_INTERVAL
+    BLOOM_STALE_RATIO = float(os.environ.get("BLOOM_STALE_RATIO", "0.05"))
+    video_id_filter = None
+    video_id_filter_built_at = 0.0
+    video_id_filter_deletes = 0
+    video_id_filter_stale = threading.Event()
+    
+    # Change stream on the videos collection drives cache and index maintenance
+    CHANGE_STREAM_ENABLED = os.environ.get("CHANGE_STREAM_ENABLED", "true").lower() == "true"
+    CHANGE_STREAM_RETRY_DELAY = 5
+    # Every replica consumes the stream itself, so each keeps its own position
+    CHANGE_STREAM_CONSUMER = os.environ.get("CHANGE_STREAM_CONSUMER") or socket.gethostname()
+    RESUME_TOKEN_KEY = f"catalog:videos:resume_token:{CHANGE_STREAM_CONSUMER}"
+    RESUME_TOKEN_TTL = int(os.environ.get("RESUME_TOKEN_TTL_HOURS", "24")) * 3600
+    RESUME_TOKEN_SAVE_INTERVAL = 1.0
+    change_stream_running = False
+    
+    # Optional full in-memory catalog snapshot, kept current by the change stream
+    SNAPSHOT_ENABLED = os.environ.get("CATALOG_SNAPSHOT_ENABLED", "false").lower() == "true"
+    catalog_snapshot = None
+    
+    # Largest batch accepted by the bulk create endpoint
+    MAX_CREATE_BATCH = int(os.environ.get("MAX_CREATE_BATCH", "100"))
+    
 else:
     logger.info("Using Custom Replication implementation")
     # Import existing implementation
@@ -59,6 +110,28 @@ else:
         logger.error(f"Custom replication modules not available: {e}")
         CUSTOM_REPLICATION_AVAILABLE = False
 
+# Cache warm-up on startup
+WARMUP_ENABLED = os.environ.get("CACHE_WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_RECENT_COUNT = int(os.environ.get("WARMUP_RECENT_COUNT", "100"))
+WARMUP_PINNED_IDS = [i.strip() for i in os.environ.get("WARMUP_PINNED_IDS", "").split(",") if i.strip()]
+WARMUP_BATCH_SIZE = int(os.environ.get("WARMUP_BATCH_SIZE", "50"))
+WARMUP_CONCURRENCY = int(os.environ.get("WARMUP_CONCURRENCY", "4"))
+WARMUP_TIMEOUT = int(os.environ.get("WARMUP_TIMEOUT", "120"))  # never block readiness longer than this
+
+warmup_lock = threading.Lock()
+warmup_status = {
+    "state": "pending",  # pending, running, ready, failed, skipped
+    "total": 0,
+    "loaded": 0,
+    "started_at": None,
+    "finished_at": None,
+    "error": None
+}
+
+def is_valid_video_id(video_id: str) -> bool:
+    """Reject malformed IDs before any I/O"""
+    return ObjectId.is_valid(video_id)
+
 # Helper functions for MongoDB Native Replica Set
 def get_from_cache(video_id: str):
     """Get video from Redis cache"""
@@ -107,19 +180,446 @@ def update_popularity_cache(video_id: str, views: int = 0):
     except Exception as e:
         logger.error(f"Popularity cache error: {e}")
 
+def query_cache_key(endpoint: str, params: dict) -> str:
+    """Cache key for a list query, independent of parameter order"""
+    normalized = json.dumps({k: v for k, v in params.items() if v is not None}, sort_keys=True)
+    return f"{QUERY_CACHE_PREFIX}{endpoint}:{hashlib.sha1(normalized.encode()).hexdigest()}"
+
+def get_query_result(key: str):
+    """Get a cached list query result"""
+    if not REDIS_AVAILABLE:
+        return None
+    try:
+        cached = redis_client.get(key)
+        if cached:
+            logger.info(f"Query cache HIT for {key}")
+            return json.loads(cached)
+        logger.info(f"Query cache MISS for {key}")
+        return None
+    except Exception as e:
+        logger.error(f"Query cache read error: {e}")
+        return None
+
+def set_query_result(key: str, result, tags: list):
+    """Store a list query result and register it under its dependency tags"""
+    if not REDIS_AVAILABLE:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.setex(key, QUERY_CACHE_TTL, json.dumps(result))
+        for tag in tags:
+            # Tag sets outlive the keys they point to, never the other way around
+            pipe.sadd(f"{QUERY_TAG_PREFIX}{tag}", key)
+            pipe.expire(f"{QUERY_TAG_PREFIX}{tag}", QUERY_CACHE_TTL * 2)
+            pipe.sadd(QUERY_TAGS_KEY, tag)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Query cache write error: {e}")
+
+def invalidate_query_tags(tags: list):
+    """Drop every cached query result registered under the given tags"""
+    if not REDIS_AVAILABLE or not tags:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.smembers(f"{QUERY_TAG_PREFIX}{tag}")
+        keys = set().union(*pipe.execute())
+        
+        pipe = redis_client.pipeline(transaction=False)
+        if keys:
+            pipe.delete(*keys)
+        pipe.delete(*[f"{QUERY_TAG_PREFIX}{tag}" for tag in tags])
+        pipe.srem(QUERY_TAGS_KEY, *tags)
+        pipe.execute()
+        logger.info(f"Query cache invalidated {len(keys)} results for tags {tags}")
+    except Exception as e:
+        logger.error(f"Query cache invalidation error: {e}")
+
+def invalidate_queries_for_change(operation: str, video: dict = None, changed_fields=None):
+    """Invalidate the list results a write can affect"""
+    # View counts in cached lists are allowed to lag by QUERY_CACHE_TTL,
+    # otherwise every play would flush every list
+    if changed_fields is not None and set(changed_fields) <= {"views"}:
+        return
+    
+    tags = ["all", "popular"]
+    if video is not None and video.get("genre"):
+        tags.append(f"genre:{video['genre']}")
+    
+    # The previous genre is unknown when it may have changed, drop all genre results
+    genre_may_have_changed = operation != "insert" and (
+        video is None or changed_fields is None or "genre" in changed_fields)
+    if genre_may_have_changed and REDIS_AVAILABLE:
+        try:
+            tags += [t for t in redis_client.smembers(QUERY_TAGS_KEY) if t.startswith("genre:")]
+        except Exception as e:
+            logger.error(f"Query cache tag lookup error: {e}")
+    
+    invalidate_query_tags(list(dict.fromkeys(tags)))
+
+def is_known_missing(video_id: str) -> bool:
+    """Check the Bloom filter and the negative cache for a video that does not exist"""
+    if video_id_filter is not None and video_id not in video_id_filter:
+        # Only trust the filter for IDs generated before it was built, newer IDs
+        # may have been created by another catalog replica since then
+        generated_at = ObjectId(video_id).generation_time.timestamp()
+        if generated_at < video_id_filter_built_at - BLOOM_CLOCK_SKEW:
+            logger.info(f"Bloom filter rejected video {video_id}")
+            return True
+    if not REDIS_AVAILABLE:
+        return False
+    try:
+        if redis_client.exists(f"{MISSING_VIDEO_PREFIX}{video_id}"):
+            logger.info(f"Negative cache HIT for video {video_id}")
+            return True
+    except Exception as e:
+        logger.error(f"Negative cache read error: {e}")
+    return False
+
+def mark_missing(video_id: str):
+    """Remember for a short time that a video does not exist"""
+    if not REDIS_AVAILABLE:
+        return
+    try:
+        redis_client.setex(f"{MISSING_VIDEO_PREFIX}{video_id}", NEGATIVE_CACHE_TTL, 1)
+    except Exception as e:
+        logger.error(f"Negative cache write error: {e}")
+
+def apply_video_change(operation: str, video_id: str, video: dict = None, changed_fields=None):
+    """Bring cache, popularity ranking and in-memory indexes in line with one write"""
+    invalidate_queries_for_change(operation, video, changed_fields)
+    
+    if catalog_snapshot is not None:
+        if operation == "delete":
+            catalog_snapshot.remove(video_id)
+        elif video is not None:
+            catalog_snapshot.upsert(video)
+    
+    if operation == "delete":
+        invalidate_cache(video_id)
+        if REDIS_AVAILABLE:
+            try:
+                redis_client.zrem(POPULAR_VIDEOS_KEY, video_id)
+            except Exception as e:
+                logger.error(f"Popularity cache error: {e}")
+        if video_id_filter is not None:
+            note_video_id_deleted()
+        mark_missing(video_id)
+        return
+    
+    if video is None:
+        invalidate_cache(video_id)
+        return
+    
+    # insert, update or replace: refresh instead of invalidating
+    set_cache(video_id, video)
+    update_popularity_cache(video_id, video.get("views", 0))
+    if operation == "insert" and video_id_filter is not None:
+        video_id_filter.add(video_id)
+
+def note_video_id_deleted():
+    """Count a deleted ID, which stays in the Bloom filter until the next rebuild
+
+    Decrementing its counters is only safe for IDs this filter was given,
+    and a delete cannot tell: the ID may be a false positive, or an insert
+    that raced the last build. Removing such an ID would hide other videos.
+    """
+    global video_id_filter_deletes
+    video_id_filter_deletes += 1
+    if video_id_filter_deletes >= max(100, video_id_filter.items * BLOOM_STALE_RATIO):
+        video_id_filter_stale.set()
+
+def build_video_id_filter():
+    """Build a fresh Bloom filter from all video IDs and swap it in"""
+    global video_id_filter, video_id_filter_built_at, video_id_filter_deletes
+    
+    started_at = time.time()
+    video_id_filter_stale.clear()
+    # Deletes from here on may or may not be seen by the scan, they count against the new filter
+    deletes_before = video_id_filter_deletes
+    try:
+        expected = videos_read_collection.estimated_document_count()
+        new_filter = CountingBloomFilter(capacity=max(10000, expected * 2))
+        for video in videos_read_collection.find({}, {"_id": 1}).batch_size(1000):
+            new_filter.add(str(video["_id"]))
+        
+        video_id_filter = new_filter
+        video_id_filter_built_at = started_at
+        video_id_filter_deletes -= deletes_before
+        logger.info(f"Bloom filter built with {new_filter.items} video IDs in {time.time() - started_at:.3f}s")
+    except Exception as e:
+        logger.error(f"Error building Bloom filter: {e}")
+
+def _video_id_filter_worker():
+    """Rebuild the Bloom filter periodically to pick up writes from other replicas and drop deleted IDs"""
+    while True:
+        build_video_id_filter()
+        video_id_filter_stale.wait(BLOOM_REBUILD_INTERVAL)
+
+def start_video_id_filter():
+    """Start the Bloom filter builder in the background"""
+    if USE_NATIVE_REPLICA_SET and BLOOM_FILTER_ENABLED:
+        threading.Thread(target=_video_id_filter_worker, daemon=True).start()
+        logger.info("Bloom filter worker started")
+
+def snapshot_serving() -> bool:
+    """The snapshot is only authoritative while the change stream keeps it current"""
+    return catalog_snapshot is not None and catalog_snapshot.ready and change_stream_running
+
+def _load_catalog_snapshot(snapshot):
+    """Stream the whole collection into a snapshot"""
+    try:
+        start_time = time.time()
+        snapshot.load(videos_read_collection.find({}, PUBLIC_PROJECTION, batch_size=1000))
+        logger.info(f"Catalog snapshot ready in {time.time() - start_time:.3f}s")
+    except Exception as e:
+        logger.error(f"Error loading catalog snapshot: {e}")
+
+def start_catalog_snapshot_load():
+    """(Re)load the snapshot in the background, reads fall back to Mongo until it is ready"""
+    global catalog_snapshot
+    if not SNAPSHOT_ENABLED:
+        return
+    
+    # Swap in the new snapshot first so change events reach it while it loads
+    catalog_snapshot = CatalogSnapshot()
+    threading.Thread(target=_load_catalog_snapshot, args=(catalog_snapshot,), daemon=True).start()
+
+def _load_resume_token():
+    """Read the last processed change stream position from Redis"""
+    if not REDIS_AVAILABLE:
+        return None
+    try:
+        token = redis_client.get(RESUME_TOKEN_KEY)
+        return json.loads(token) if token else None
+    except Exception as e:
+        logger.error(f"Error loading resume token: {e}")
+        return None
+
+def _save_resume_token(token):
+    """Persist the change stream position so a restart resumes without gaps"""
+    if not REDIS_AVAILABLE:
+        return
+    try:
+        if token is None:
+            redis_client.delete(RESUME_TOKEN_KEY)
+        else:
+            # Expires so positions of replicas that are gone for good do not pile up
+            redis_client.set(RESUME_TOKEN_KEY, json.dumps(dict(token)), ex=RESUME_TOKEN_TTL)
+    except Exception as e:
+        logger.error(f"Error saving resume token: {e}")
+
+def handle_change_event(change: dict):
+    """Apply one change stream event on the videos collection"""
+    operation = change["operationType"]
+    if operation not in ("insert", "update", "replace", "delete"):
+        logger.warning(f"Change stream event '{operation}' ignored")
+        return
+    
+    video_id = str(change["documentKey"]["_id"])
+    video = change.get("fullDocument")
+    if video is not None:
+        video["_id"] = str(video["_id"])
+    
+    changed_fields = None
+    if operation == "update":
+        description = change.get("updateDescription", {})
+        changed_fields = list(description.get("updatedFields", {})) + list(description.get("removedFields", []))
+    
+    # fullDocument is None for deletes, and for updates of documents deleted since
+    apply_video_change(operation, video_id, video, changed_fields)
+
+def _change_stream_worker():
+    """Consume the videos change stream, resuming from the stored token"""
+    global change_stream_running
+    
+    resume_token = _load_resume_token()
+    # The snapshot must be (re)loaded whenever the feed cannot guarantee continuity
+    needs_snapshot = True
+    while True:
+        try:
+            with videos_collection.watch([{"$project": {f"fullDocument.{field}": 0 for field in PUBLIC_PROJECTION}}],
+                                         full_document="updateLookup",
+                                         resume_after=resume_token,
+                                         max_await_time_ms=1000) as stream:
+                change_stream_running = True
+                logger.info(f"Change stream opened ({'resuming' if resume_token else 'from now'})")
+                if needs_snapshot:
+                    start_catalog_snapshot_load()
+                    needs_snapshot = False
+                
+                saved_token = resume_token
+                last_saved = time.time()
+                while stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        try:
+                            handle_change_event(change)
+                        except Exception as e:
+                            # Skip it: re-raising would reopen the stream at this event and replay it forever
+                            logger.error(f"Failed to apply change event {change.get('operationType')} "
+                                         f"for {change.get('documentKey')}, skipping it: {e}")
+                            try:
+                                invalidate_cache(str(change["documentKey"]["_id"]))
+                            except Exception:
+                                pass
+                        if change["operationType"] == "invalidate":
+                            # Cannot resume after an invalidate, start over from now
+                            resume_token = None
+                            needs_snapshot = True
+                            break
+                    resume_token = stream.resume_token
+                    
+                    if resume_token != saved_token and time.time() - last_saved >= RESUME_TOKEN_SAVE_INTERVAL:
+                        _save_resume_token(resume_token)
+                        saved_token = resume_token
+                        last_saved = time.time()
+                
+                _save_resume_token(resume_token)
+        except OperationFailure as e:
+            # 286 ChangeStreamHistoryLost, 280 ChangeStreamFatalError
+            if e.code in (280, 286):
+                logger.warning(f"Change stream cannot resume, starting from now: {e}")
+                resume_token = None
+                needs_snapshot = True
+                _save_resume_token(None)
+                if video_id_filter is not None:
+                    build_video_id_filter()
+            else:
+                logger.error(f"Change stream error: {e}")
+        except Exception as e:
+            logger.error(f"Change stream error: {e}")
+        
+        change_stream_running = False
+        time.sleep(CHANGE_STREAM_RETRY_DELAY)
+
+def start_change_stream():
+    """Start the change stream consumer in the background"""
+    if USE_NATIVE_REPLICA_SET and CHANGE_STREAM_ENABLED:
+        threading.Thread(target=_change_stream_worker, daemon=True).start()
+        logger.info("Change stream worker started")
+    elif USE_NATIVE_REPLICA_SET and SNAPSHOT_ENABLED:
+        logger.warning("Catalog snapshot requires the change stream, reads will use MongoDB")
+
+def _warm_batch(video_ids: list):
+    """Load one batch of videos with a single $in read and a pipelined cache write"""
+    videos = list(videos_read_collection.find({"_id": {"$in": [ObjectId(v) for v in video_ids]}}, PUBLIC_PROJECTION))
+    
+    pipe = redis_client.pipeline(transaction=False)
+    for video in videos:
+        video["_id"] = str(video["_id"])
+        pipe.setex(f"video:{video['_id']}", CACHE_TTL, json.dumps(video))
+    pipe.execute()
+    
+    with warmup_lock:
+        warmup_status["loaded"] += len(video_ids)
+
+def warm_cache():
+    """Load popular, recent and pinned videos into the cache"""
+    with warmup_lock:
+        warmup_status["state"] = "running"
+        warmup_status["started_at"] = time.time()
+    
+    try:
+        # Popular first, then pinned, then most recent, without duplicates
+        candidate_ids = list(redis_client.zrevrange(POPULAR_VIDEOS_KEY, 0, -1))
+        candidate_ids += WARMUP_PINNED_IDS
+        recent = videos_read_collection.find({}, {"_id": 1}).sort("_id", -1).limit(WARMUP_RECENT_COUNT)
+        candidate_ids += [str(video["_id"]) for video in recent]
+        video_ids = [v for v in dict.fromkeys(candidate_ids) if is_valid_video_id(v)]
+        
+        batches = [video_ids[i:i + WARMUP_BATCH_SIZE] for i in range(0, len(video_ids), WARMUP_BATCH_SIZE)]
+        with warmup_lock:
+            warmup_status["total"] = len(video_ids)
+        
+        with ThreadPoolExecutor(max_workers=WARMUP_CONCURRENCY) as executor:
+            # list() re-raises the first batch error, if any
+            list(executor.map(_warm_batch, batches))
+        
+        with warmup_lock:
+            warmup_status["state"] = "ready"
+            warmup_status["finished_at"] = time.time()
+        logger.info(f"Cache warm-up loaded {len(video_ids)} videos in {warmup_status['finished_at'] - warmup_status['started_at']:.3f}s")
+    except Exception as e:
+        logger.error(f"Cache warm-up failed: {e}")
+        with warmup_lock:
+            warmup_status["state"] = "failed"
+            warmup_status["finished_at"] = time.time()
+            warmup_status["error"] = str(e)
+
+def start_cache_warmup():
+    """Start the cache warm-up in the background"""
+    if not (WARMUP_ENABLED and USE_NATIVE_REPLICA_SET and REDIS_AVAILABLE):
+        warmup_status["state"] = "skipped"
+        return
+    threading.Thread(target=warm_cache, daemon=True).start()
+    logger.info("Cache warm-up started")
+
+def ensure_indexes():
+    """Indexes needed by lookups other than _id"""
+    if not USE_NATIVE_REPLICA_SET:
+        return
+    try:
+        # Retried creates (upload outbox) are recognised by their idempotency key
+        videos_collection.create_index("idempotency_key", unique=True,
+                                       partialFilterExpression={"idempotency_key": {"$type": "string"}})
+    except Exception as e:
+        logger.error(f"Failed to create catalog indexes: {e}")
+
+def is_ready() -> bool:
+    """Ready once warm-up has finished, failed, or taken longer than WARMUP_TIMEOUT"""
+    with warmup_lock:
+        if warmup_status["state"] in ("ready", "failed", "skipped"):
+            return True
+        started_at = warmup_status["started_at"]
+    return started_at is not None and time.time() - started_at > WARMUP_TIMEOUT
+
 # Routes
+# Types of the fields clients may write; caches, snapshot and indexes rely on them
+VIDEO_FIELD_TYPES = {"title": str, "description": str, "duration": (int, float), "genre": str, "video_url": str}
+# Sent back by clients that echo a whole video, ignored by updates: _id is immutable
+# and views are only changed through the view endpoint
+READ_ONLY_VIDEO_FIELDS = ("_id", "views")
+
+def validate_video_fields(data: dict) -> str:
+    """Error message for a known field with the wrong type, or None"""
+    for field, expected in VIDEO_FIELD_TYPES.items():
+        if field not in data:
+            continue
+        value = data[field]
+        if field == "duration":
+            if isinstance(value, bool) or not isinstance(value, expected) or value != value or value < 0:
+                return "Field 'duration' must be a number (e.g., seconds)"
+        elif not isinstance(value, expected):
+            return f"Field '{field}' must be a string"
+    return None
+
+def validate_video_payload(data) -> str:
+    """Error message for an invalid create payload, or None"""
+    required_fields = ["title", "description", "duration", "genre", "video_url"]
+    if not isinstance(data, dict) or not all(k in data for k in required_fields):
+        missing = [k for k in required_fields if not isinstance(data, dict) or k not in data]
+        return f"Missing fields: {', '.join(missing)} are required"
+    return validate_video_fields(data)
+
+def find_by_idempotency_key(collection, key: str):
+    video = collection.find_one({"idempotency_key": key}, PUBLIC_PROJECTION)
+    if video:
+        video["_id"] = str(video["_id"])
+    return video
+
 @app.route('/videos', methods=['POST'])
 def create_video_route():
     """Create video - compatible with both implementations"""
     data = request.get_json()
     
-    required_fields = ["title", "description", "duration", "genre", "video_url"]
-    if not data or not all(k in data for k in required_fields):
-        missing = [k for k in required_fields if k not in data]
-        return jsonify({"error": f"Missing fields: {', '.join(missing)} are required"}), 400
-
-    if not isinstance(data.get('duration'), (int, float)):
-        return jsonify({"error": "Field 'duration' must be a number (e.g., seconds)"}), 400
+    error = validate_video_payload(data)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    # Retried requests with the same key return the video created the first time
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
 
     # Determine replication strategy
     use_sync = data.get('sync_replication', True)
@@ -134,6 +634,8 @@ def create_video_route():
             "video_url": data['video_url'],
             "views": 0
         }
+        if idempotency_key:
+            video_data["idempotency_key"] = idempotency_key
         
         write_concern = WriteConcern(w="majority", j=True) if use_sync else WriteConcern(w=1)
         
@@ -141,19 +643,29 @@ def create_video_route():
             start_time = time.time()
             
             collection = db.get_collection("videos", write_concern=write_concern)
-            result = collection.insert_one(video_data)
+            try:
+                result = collection.insert_one(video_data)
+            except DuplicateKeyError:
+                if not idempotency_key:
+                    raise
+                existing = find_by_idempotency_key(collection, idempotency_key)
+                return jsonify({
+                    "video": existing,
+                    "video_id": existing["_id"] if existing else None,
+                    "replication_type": "native_replica_set",
+                    "message": "Video already created for this idempotency key"
+                }), 200
             video_id = str(result.inserted_id)
             
             end_time = time.time()
             
-            # Update cache
-            update_popularity_cache(video_id, 0)
-            
             # Retrieve created video
-            created_video = collection.find_one({"_id": result.inserted_id})
+            created_video = collection.find_one({"_id": result.inserted_id}, PUBLIC_PROJECTION)
             if created_video:
                 created_video["_id"] = str(created_video["_id"])
-                set_cache(video_id, created_video)
+                # The change stream updates cache and indexes when it is running
+                if not change_stream_running:
+                    apply_video_change("insert", video_id, created_video)
             
             return jsonify({
                 "video": created_video,
@@ -194,16 +706,119 @@ def create_video_route():
         else:
             return jsonify({"error": "Failed to create video"}), 500
 
+@app.route('/videos/batch', methods=['POST'])
+def create_videos_batch_route():
+    """Create many videos in one insert_many, with per-item results"""
+    if not USE_NATIVE_REPLICA_SET:
+        return jsonify({"error": "Batch creation requires the native replica set implementation"}), 501
+    
+    data = request.get_json(silent=True) or {}
+    items = data.get("videos")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Field 'videos' must be a non-empty list"}), 400
+    if len(items) > MAX_CREATE_BATCH:
+        return jsonify({"error": f"At most {MAX_CREATE_BATCH} videos per batch"}), 400
+    
+    write_concern = WriteConcern(w="majority", j=True) if data.get('sync_replication', True) else WriteConcern(w=1)
+    collection = db.get_collection("videos", write_concern=write_concern)
+    
+    results = [None] * len(items)
+    documents = []
+    positions = []
+    try:
+        keys = [item.get("idempotency_key") for item in items if isinstance(item, dict) and item.get("idempotency_key")]
+        existing = {}
+        if keys:
+            for video in collection.find({"idempotency_key": {"$in": keys}}, {"_id": 1, "idempotency_key": 1}):
+                existing[video["idempotency_key"]] = str(video["_id"])
+        
+        for index, item in enumerate(items):
+            error = validate_video_payload(item)
+            key = item.get("idempotency_key") if isinstance(item, dict) else None
+            if error:
+                results[index] = {"status": "error", "error": error, "idempotency_key": key}
+            elif key in existing:
+                # None: repeated inside this batch, resolved once the first one is inserted
+                if existing[key] is not None:
+                    results[index] = {"status": "exists", "video_id": existing[key], "idempotency_key": key}
+            else:
+                video_data = {
+                    "title": item['title'],
+                    "description": item['description'],
+                    "duration": item['duration'],
+                    "genre": item['genre'],
+                    "video_url": item['video_url'],
+                    "views": 0
+                }
+                if key:
+                    video_data["idempotency_key"] = key
+                    # The same key twice in one batch is created once
+                    existing[key] = None
+                documents.append(video_data)
+                positions.append(index)
+        
+        failed = {}
+        if documents:
+            try:
+                collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    failed[write_error["index"]] = write_error
+        
+        for doc_index, (index, video_data) in enumerate(zip(positions, documents)):
+            key = video_data.get("idempotency_key")
+            if doc_index in failed:
+                if failed[doc_index].get("code") == 11000 and key:
+                    # Created concurrently by a retry of the same request
+                    video = find_by_idempotency_key(collection, key)
+                    results[index] = {"status": "exists", "video_id": video["_id"] if video else None, "idempotency_key": key}
+                else:
+                    results[index] = {"status": "error", "error": failed[doc_index].get("errmsg"), "idempotency_key": key}
+                continue
+            video_id = str(video_data["_id"])
+            results[index] = {"status": "created", "video_id": video_id, "idempotency_key": key}
+            if not change_stream_running:
+                video = {k: v for k, v in video_data.items() if k not in PUBLIC_PROJECTION}
+                apply_video_change("insert", video_id, dict(video, _id=video_id))
+        
+        # Duplicated keys inside the batch point at the video created for the first one
+        for index, result in enumerate(results):
+            if result is None:
+                key = items[index]["idempotency_key"]
+                created = next((r for r in results if r and r.get("idempotency_key") == key and r.get("video_id")), None)
+                results[index] = {"status": "exists", "video_id": created["video_id"] if created else None, "idempotency_key": key}
+    except Exception as e:
+        logger.error(f"Error creating video batch: {e}")
+        return jsonify({"error": str(e)}), 500
+    
+    created_count = sum(1 for r in results if r["status"] == "created")
+    logger.info(f"Batch create: {created_count} created out of {len(items)}")
+    return jsonify({"results": results, "created": created_count}), 200
+
 @app.route('/videos/<video_id>', methods=['GET'])
 def get_video_route(video_id):
     """Get video by ID with configurable read preferences"""
     read_source = request.args.get('read_from', 'primary')  # primary, secondary, cache
     use_cache = request.args.get('cache', 'true').lower() == 'true'
     
+    if not is_valid_video_id(video_id):
+        return jsonify({"error": "Invalid video ID"}), 400
+    
     if USE_NATIVE_REPLICA_SET:
         try:
             start_time = time.time()
             
+            if snapshot_serving():
+                video = catalog_snapshot.get(video_id)
+                if not video:
+                    return jsonify({"error": "Video not found"}), 404
+                end_time = time.time()
+                return jsonify({
+                    "video": video,
+                    "read_source": "snapshot",
+                    "time_taken": f"{end_time - start_time:.4f}s"
+                })
+            
             # Try cache first if enabled
             if use_cache:
                 cached_video = get_from_cache(video_id)
@@ -214,6 +829,9 @@ def get_video_route(video_id):
                         "read_source": "cache",
                         "time_taken": f"{end_time - start_time:.4f}s"
                     })
+                
+                if is_known_missing(video_id):
+                    return jsonify({"error": "Video not found"}), 404
             
             # Choose collection based on read preference
             if read_source == "secondary":
@@ -223,7 +841,7 @@ def get_video_route(video_id):
                 collection = videos_collection
                 logger.info(f"Reading video {video_id} from PRIMARY")
             
-            video = collection.find_one({"_id": ObjectId(video_id)})
+            video = collection.find_one({"_id": ObjectId(video_id)}, PUBLIC_PROJECTION)
             end_time = time.time()
             
             if video:
@@ -239,6 +857,7 @@ def get_video_route(video_id):
                     "time_taken": f"{end_time - start_time:.4f}s"
                 })
             else:
+                mark_missing(video_id)
                 return jsonify({"error": "Video not found"}), 404
             
         except Exception as e:
@@ -265,11 +884,45 @@ def get_video_route(video_id):
 @app.route('/videos/<video_id>', methods=['PUT'])
 def update_video_route(video_id):
     """Update the existing video's metadata"""
-    data_update = request.get_json()
-    if not data_update:
+    if not is_valid_video_id(video_id):
+        return jsonify({"error": "Invalid video ID"}), 400
+    
+    data_update = request.get_json(silent=True)
+    if not data_update or not isinstance(data_update, dict):
         return jsonify({"error": "Invalid JSON data"}), 400
+    error = validate_video_fields(data_update)
+    if error:
+        return jsonify({"error": error}), 400
+    # Internal fields (idempotency_key, ...) must not be writable by clients
+    unknown = [k for k in data_update if k not in VIDEO_FIELD_TYPES and k not in READ_ONLY_VIDEO_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Fields cannot be updated: {', '.join(unknown)}"}), 400
+    update_fields = {k: v for k, v in data_update.items() if k in VIDEO_FIELD_TYPES}
+    if not update_fields:
+        return jsonify({"error": "No updatable fields provided"}), 400
     
-    success = db.update_video(video_id, data_update, use_sync_replication=True)
+    if USE_NATIVE_REPLICA_SET:
+        try:
+            collection = db.get_collection("videos", write_concern=WriteConcern(w="majority", j=True))
+            updated_video = collection.find_one_and_update(
+                {"_id": ObjectId(video_id)},
+                {"$set": update_fields},
+                projection=PUBLIC_PROJECTION,
+                return_document=ReturnDocument.AFTER
+            )
+            
+            if updated_video:
+                updated_video["_id"] = str(updated_video["_id"])
+                if not change_stream_running:
+                    apply_video_change("update", video_id, updated_video, list(update_fields))
+                return jsonify({"status": "success", "message": "Video updated", "video": updated_video }), 200
+            else:
+                return jsonify({"error": "Video not found or failed to update"}), 404
+        except Exception as e:
+            logger.error(f"Error updating video {video_id}: {e}")
+            return jsonify({"error": str(e)}), 500
+    
+    success = db.update_video(video_id, update_fields, use_sync_replication=True)
     
     if success:
         # Return the updated video data
@@ -281,13 +934,19 @@ def update_video_route(video_id):
 @app.route('/videos/<video_id>', methods=['DELETE'])
 def delete_video_route(video_id):
     """Apaga os metadados de um vídeo da base de dados."""
+    if not is_valid_video_id(video_id):
+        return jsonify({"error": "Invalid video ID"}), 400
+    
     try:
+        if is_known_missing(video_id):
+            return jsonify({"error": "Vídeo não encontrado"}), 404
+        
         # Apaga de ambas as bases de dados (primary e replica)
         delete_result = videos_collection.delete_one({"_id": ObjectId(video_id)})
         if delete_result.deleted_count > 0:
-            invalidate_cache(video_id) # Remove do cache
-            if REDIS_AVAILABLE:
-                redis_client.zrem(POPULAR_VIDEOS_KEY, video_id) 
+            # Cache, ranking e índices são atualizados pelo change stream
+            if not change_stream_running:
+                apply_video_change("delete", video_id)
             logger.info(f"Vídeo {video_id} apagado com sucesso.")
             return jsonify({"status": "success", "message": "Video deleted successfully"}), 200
         else:
@@ -303,17 +962,42 @@ def get_videos_route():
     """Get all videos with configurable read preferences"""
     read_preference = request.args.get('read_from', 'secondary')
     use_cache = request.args.get('cache', 'true').lower() == 'true'
+    genre = request.args.get('genre')
     
     if USE_NATIVE_REPLICA_SET:
         try:
+            if snapshot_serving():
+                videos = catalog_snapshot.list(genre=genre, limit=50)
+                return jsonify({
+                    "videos": videos,
+                    "count": len(videos),
+                    "read_source": "snapshot",
+                    "cached_optimization": use_cache
+                })
+            
+            cache_key = query_cache_key("videos", {"genre": genre, "limit": 50})
+            if use_cache:
+                cached_videos = get_query_result(cache_key)
+                if cached_videos is not None:
+                    return jsonify({
+                        "videos": cached_videos,
+                        "count": len(cached_videos),
+                        "read_source": "query_cache",
+                        "cached_optimization": use_cache
+                    })
+            
             # Choose collection based on read preference
             collection = videos_read_collection if read_preference == "secondary" else videos_collection
             
+            query = {"genre": genre} if genre else {}
             videos = []
-            for video in collection.find().limit(50):  # Limit for performance
+            for video in collection.find(query, PUBLIC_PROJECTION).limit(50):  # Limit for performance
                 video["_id"] = str(video["_id"])
                 videos.append(video)
             
+            if use_cache:
+                set_query_result(cache_key, videos, [f"genre:{genre}"] if genre else ["all"])
+            
             logger.info(f"Retrieved {len(videos)} videos from {read_preference}")
             return jsonify({
                 "videos": videos,
@@ -343,7 +1027,21 @@ def get_videos_route():
 @app.route('/videos/<video_id>/view', methods=['POST'])
 def increment_view_route(video_id):
     """Incrementa a contagem de visualizações de um vídeo."""
+    if not is_valid_video_id(video_id):
+        return jsonify({"error": "Invalid video ID"}), 400
+    
+    if not USE_NATIVE_REPLICA_SET:
+        # Use custom implementation
+        if not CUSTOM_REPLICATION_AVAILABLE:
+            return jsonify({"error": "Custom replication not available"}), 500
+        if db.increment_view_count(video_id):
+            return jsonify({"status": "success"}), 200
+        return jsonify({"error": "Vídeo não encontrado para incrementar view"}), 404
+    
     try:
+        if is_known_missing(video_id):
+            return jsonify({"error": "Vídeo não encontrado para incrementar view"}), 404
+        
         # Usar WriteConcern para garantir a escrita no replica set
         wc = WriteConcern(w="majority", wtimeout=1000)
         collection_with_wc = db.get_collection("videos", write_concern=wc)
@@ -355,25 +1053,121 @@ def increment_view_route(video_id):
         
         if result.modified_count > 0:
             logger.info(f"Contagem de views incrementada para o vídeo {video_id} na base de dados.")
-            if REDIS_AVAILABLE:
-                redis_client.zincrby(POPULAR_VIDEOS_KEY, 1, video_id)
-                logger.info(f"Contagem de views incrementada para o vídeo {video_id} no Redis.")
-            invalidate_cache(video_id)
+            if not change_stream_running:
+                if REDIS_AVAILABLE:
+                    redis_client.zincrby(POPULAR_VIDEOS_KEY, 1, video_id)
+                    logger.info(f"Contagem de views incrementada para o vídeo {video_id} no Redis.")
+                invalidate_cache(video_id)
             return jsonify({"status": "success"}), 200
         else:
+            if result.matched_count == 0:
+                mark_missing(video_id)
             return jsonify({"error": "Vídeo não encontrado para incrementar view"}), 404
     except Exception as e:
         logger.error(f"Erro ao incrementar views para o vídeo {video_id}: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/videos/views/batch', methods=['POST'])
+def increment_views_batch_route():
+    """Apply aggregated view counts in one bulk write (used by the streaming service)"""
+    if not USE_NATIVE_REPLICA_SET and not CUSTOM_REPLICATION_AVAILABLE:
+        return jsonify({"error": "Custom replication not available"}), 500
+    
+    data = request.get_json(silent=True) or {}
+    increments = data.get("increments")
+    if not isinstance(increments, list) or not increments:
+        return jsonify({"error": "Field 'increments' must be a non-empty list"}), 400
+    if len(increments) > MAX_VIEW_BATCH:
+        return jsonify({"error": f"At most {MAX_VIEW_BATCH} increments per batch"}), 400
+    
+    # Merge duplicates; entries name the video by id, a video_url can be shared by
+    # deduplicated uploads and would count one play for all of them
+    counts_by_id = {}
+    for item in increments:
+        count = item.get("count", 1) if isinstance(item, dict) else None
+        if not isinstance(count, int) or isinstance(count, bool) or count <= 0:
+            return jsonify({"error": "Each increment needs a positive integer 'count'"}), 400
+        if not item.get("video_id") or not is_valid_video_id(item["video_id"]):
+            return jsonify({"error": f"Invalid video ID: {item.get('video_id')}"}), 400
+        counts_by_id[item["video_id"]] = counts_by_id.get(item["video_id"], 0) + count
+    
+    if not USE_NATIVE_REPLICA_SET:
+        return increment_views_batch_custom(counts_by_id)
+    
+    try:
+        unmatched = []
+        wc = WriteConcern(w="majority", wtimeout=1000)
+        collection_with_wc = db.get_collection("videos", write_concern=wc)
+        operations = [UpdateOne({"_id": ObjectId(video_id)}, {"$inc": {"views": count}})
+                      for video_id, count in counts_by_id.items()]
+        result = collection_with_wc.bulk_write(operations, ordered=False)
+        
+        if result.matched_count < len(operations):
+            matched = {str(v["_id"]) for v in videos_collection.find(
+                {"_id": {"$in": [ObjectId(i) for i in counts_by_id]}}, {"_id": 1})}
+            for video_id in counts_by_id:
+                if video_id not in matched:
+                    unmatched.append(video_id)
+                    mark_missing(video_id)
+        
+        if not change_stream_running:
+            for video_id, count in counts_by_id.items():
+                if video_id in unmatched:
+                    continue
+                if REDIS_AVAILABLE:
+                    redis_client.zincrby(POPULAR_VIDEOS_KEY, count, video_id)
+                invalidate_cache(video_id)
+        
+        logger.info(f"Applied {sum(counts_by_id.values())} views to {result.modified_count} videos in one batch")
+        return jsonify({"status": "success", "updated": result.modified_count, "unmatched": unmatched}), 200
+    except Exception as e:
+        logger.error(f"Erro ao aplicar views em lote: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def increment_views_batch_custom(counts_by_id):
+    """Bulk view increments for the custom replication setup, one replicated write per video"""
+    try:
+        unmatched = []
+        updated = 0
+        for video_id, count in counts_by_id.items():
+            if db.increment_view_count(video_id, count):
+                updated += 1
+            else:
+                unmatched.append(video_id)
+        
+        logger.info(f"Applied {sum(counts_by_id.values())} views to {updated} videos in one batch")
+        return jsonify({"status": "success", "updated": updated, "unmatched": unmatched}), 200
+    except Exception as e:
+        logger.error(f"Erro ao aplicar views em lote: {e}")
+        return jsonify({"error": str(e)}), 500
+
 
 @app.route('/videos/popular', methods=['GET'])
 def get_popular_videos_route():
     """Get most popular videos from cache"""
     limit = int(request.args.get('limit', 10))
     
+    if USE_NATIVE_REPLICA_SET and snapshot_serving():
+        popular_videos = catalog_snapshot.popular(limit)
+        return jsonify({
+            "popular_videos": popular_videos,
+            "count": len(popular_videos),
+            "source": "snapshot",
+            "message": f"Top {limit} popular videos from in-memory snapshot"
+        })
+    
     if USE_NATIVE_REPLICA_SET and REDIS_AVAILABLE:
         try:
+            cache_key = query_cache_key("popular", {"limit": limit})
+            cached_popular = get_query_result(cache_key)
+            if cached_popular is not None:
+                return jsonify({
+                    "popular_videos": cached_popular,
+                    "count": len(cached_popular),
+                    "source": "query_cache",
+                    "message": f"Top {limit} popular videos from cache"
+                })
+            
             # Get IDs of most popular videos (descending order)
             popular_ids = redis_client.zrevrange(POPULAR_VIDEOS_KEY, 0, limit-1)
             
@@ -384,7 +1178,7 @@ def get_popular_videos_route():
                 
                 if not video_data:
                     # If not in cache, search in database
-                    video_data = videos_collection.find_one({"_id": ObjectId(video_id)})
+                    video_data = videos_collection.find_one({"_id": ObjectId(video_id)}, PUBLIC_PROJECTION)
                     if video_data:
                         video_data["_id"] = str(video_data["_id"])
                         set_cache(video_id, video_data)
@@ -392,6 +1186,8 @@ def get_popular_videos_route():
                 if video_data:
                     popular_videos.append(video_data)
             
+            set_query_result(cache_key, popular_videos, ["popular"])
+            
             logger.info(f"Returned {len(popular_videos)} popular videos")
             return jsonify({
                 "popular_videos": popular_videos,
@@ -459,7 +1255,11 @@ def get_implementation_info():
             "async_replication": True,
             "cache": REDIS_AVAILABLE if USE_NATIVE_REPLICA_SET else (CUSTOM_REPLICATION_AVAILABLE),
             "read_preferences": USE_NATIVE_REPLICA_SET,
-            "write_concerns": USE_NATIVE_REPLICA_SET
+            "write_concerns": USE_NATIVE_REPLICA_SET,
+            "negative_cache": REDIS_AVAILABLE if USE_NATIVE_REPLICA_SET else None,
+            "change_stream": change_stream_running if USE_NATIVE_REPLICA_SET else None,
+            "snapshot": catalog_snapshot.stats() if USE_NATIVE_REPLICA_SET and catalog_snapshot is not None else None,
+            "bloom_filter": video_id_filter.stats() if USE_NATIVE_REPLICA_SET and video_id_filter is not None else None
         }
     })
 
@@ -504,6 +1304,28 @@ def get_replication_status_route():
             "message": "Custom replication status retrieved successfully"
         })
 
+@app.route('/health/ready', methods=['GET'])
+def readiness_route():
+    """Readiness probe reporting cache warm-up progress"""
+    with warmup_lock:
+        status = dict(warmup_status)
+    ready = is_ready()
+    status["ready"] = ready
+    return jsonify(status), 200 if ready else 503
+
+# Auto-initialization
+def start_background_workers():
+    """Indexes and background threads, once per serving process"""
+    ensure_indexes()
+    start_video_id_filter()
+    start_change_stream()
+    start_cache_warmup()
+
 if __name__ == '__main__':
     logger.info(f"UALFlix Catalog Service started with {('MongoDB Native Replica Set' if USE_NATIVE_REPLICA_SET else 'Custom Replication')} implementation")
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # debug=True runs this file twice: the reloader parent only watches files, the child (WERKZEUG_RUN_MAIN) serves
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_workers()
+    app.run(host='0.0.0.0', port=5000, debug=True)
+else:
+    start_background_workers()
\ No newline at end of file
@@ -0,0 +1,69 @@
+import hashlib
+import threading
+import math
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CountingBloomFilter:
+    """Counting Bloom filter of existing video IDs (supports add and remove)"""
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        # Standard sizing: m = -n*ln(p)/ln(2)^2, k = m/n*ln(2)
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)) + 1
+        self.hash_count = max(1, int(round(self.size / self.capacity * math.log(2))))
+
+        # One byte counter per slot, saturating at 255
+        self.counters = bytearray(self.size)
+        self.items = 0
+        self.lock = threading.Lock()
+
+    def _positions(self, key: str):
+        """Double hashing: h1 + i*h2 over a single blake2b digest"""
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str):
+        """Add a key to the filter"""
+        with self.lock:
+            for pos in self._positions(key):
+                if self.counters[pos] < 255:
+                    self.counters[pos] += 1
+            self.items += 1
+
+    def remove(self, key: str):
+        """Remove a key known to have been added to this filter
+
+        The filter cannot tell an added key from a false positive, and
+        decrementing the counters of a key that was never added turns other
+        keys into false negatives, so callers that cannot be sure must leave
+        the key in and rebuild the filter instead.
+        """
+        positions = self._positions(key)
+        with self.lock:
+            # Keys that are certainly absent are skipped, counters never go below zero
+            if not all(self.counters[pos] for pos in positions):
+                return
+            for pos in positions:
+                # Saturated counters stay put, we no longer know their real value
+                if 0 < self.counters[pos] < 255:
+                    self.counters[pos] -= 1
+            self.items = max(0, self.items - 1)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.counters[pos] for pos in self._positions(key))
+
+    def stats(self) -> dict:
+        """Filter sizing and fill information"""
+        return {
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "size": self.size,
+            "hash_count": self.hash_count,
+            "items": self.items
+        }
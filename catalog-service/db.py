@@ -112,10 +112,10 @@ def get_all_videos(use_cache=True):
         logger.error(f"Error getting all videos: {e}")
         return []
 
-def increment_view_count(video_id):
+def increment_view_count(video_id, count=1):
     """Increment view counter with replication and cache"""
     try:
-        success = replication_manager.increment_views(video_id)
+        success = replication_manager.increment_views(video_id, count)
         
         if success:
             logger.info(f"Views incremented successfully for video {video_id}")
@@ -262,13 +262,13 @@ class ReplicationManager:
             logger.error(f"Error getting popular videos: {e}")
             return []
     
-    def increment_views(self, video_id: str) -> bool:
+    def increment_views(self, video_id: str, count: int = 1) -> bool:
         """Increment views and update popularity cache"""
         try:
             # Update in primary database (synchronous)
             result = self.primary_mongo.update_one(
                 {"_id": ObjectId(video_id)},
-                {"$inc": {"views": 1}}
+                {"$inc": {"views": count}}
             )
             
             if result.modified_count > 0:
@@ -283,7 +283,7 @@ class ReplicationManager:
                 })
                 
                 # Update popularity ranking
-                self.redis_client.zincrby(self.POPULAR_VIDEOS_KEY, 1, video_id)
+                self.redis_client.zincrby(self.POPULAR_VIDEOS_KEY, count, video_id)
                 
                 # Invalidate video cache to force refresh
                 self._invalidate_cache(video_id)
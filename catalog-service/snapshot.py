@@ -0,0 +1,202 @@
+import math
+import threading
+import bisect
+import heapq
+import logging
+from array import array
+from typing import Dict, Any, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INT64_MAX = 2 ** 63 - 1
+
+def _as_float(value, default: float = 0.0) -> float:
+    """Numeric column value, default for anything that is not a finite number"""
+    if isinstance(value, bool):
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if math.isfinite(number) else default
+
+def _as_int(value, default: int = 0) -> int:
+    number = _as_float(value, default)
+    return int(max(-INT64_MAX, min(INT64_MAX, number)))
+
+class CatalogSnapshot:
+    """Compact in-memory copy of the whole catalog stored as columnar arrays"""
+
+    # Fields kept in their own column, anything else goes to the per-slot extras
+    COLUMNS = ("_id", "title", "description", "duration", "genre", "video_url", "views")
+
+    def __init__(self):
+        self.lock = threading.RLock()
+
+        # One entry per slot, slots are kept dense (swap-remove on delete)
+        self.ids = []
+        self.titles = []
+        self.descriptions = []
+        self.durations = array("d")
+        self.genre_codes = array("H")
+        self.video_urls = []
+        self.views = array("q")
+        self.extras = []
+
+        # Interned genres, most catalogs only have a handful
+        self.genres = []
+        self.genre_index = {}
+
+        # video_id -> slot, plus IDs in ascending order (ObjectId hex sorts by creation time)
+        self.slot_by_id = {}
+        self.sorted_ids = []
+
+        # IDs deleted while the initial load is running, so the loader does not resurrect them
+        self.loading = False
+        self.tombstones = set()
+        self.ready = False
+
+    def _genre_code(self, genre: str) -> int:
+        code = self.genre_index.get(genre)
+        if code is None:
+            code = len(self.genres)
+            self.genres.append(genre)
+            self.genre_index[genre] = code
+        return code
+
+    def _write_slot(self, slot: int, video: Dict[str, Any]):
+        self.titles[slot] = video.get("title")
+        self.descriptions[slot] = video.get("description")
+        # Documents can hold anything a client managed to write, the typed columns must not fail on it
+        self.durations[slot] = _as_float(video.get("duration"))
+        genre = video.get("genre")
+        self.genre_codes[slot] = self._genre_code(genre if isinstance(genre, str) and genre else "General")
+        self.video_urls[slot] = video.get("video_url")
+        self.views[slot] = _as_int(video.get("views"))
+        extras = {k: v for k, v in video.items() if k not in self.COLUMNS}
+        self.extras[slot] = extras or None
+
+    def _read_slot(self, slot: int) -> Dict[str, Any]:
+        video = {
+            "_id": self.ids[slot],
+            "title": self.titles[slot],
+            "description": self.descriptions[slot],
+            "duration": self.durations[slot],
+            "genre": self.genres[self.genre_codes[slot]],
+            "video_url": self.video_urls[slot],
+            "views": self.views[slot]
+        }
+        # Keep integer durations looking like they did in Mongo
+        if video["duration"].is_integer():
+            video["duration"] = int(video["duration"])
+        if self.extras[slot]:
+            video.update(self.extras[slot])
+        return video
+
+    def upsert(self, video: Dict[str, Any], only_if_absent: bool = False):
+        """Insert or replace one video (expects a string _id)"""
+        video_id = video["_id"]
+        with self.lock:
+            if self.loading and only_if_absent and video_id in self.tombstones:
+                return
+            slot = self.slot_by_id.get(video_id)
+            if slot is None:
+                slot = len(self.ids)
+                self.ids.append(video_id)
+                self.titles.append(None)
+                self.descriptions.append(None)
+                self.durations.append(0.0)
+                self.genre_codes.append(0)
+                self.video_urls.append(None)
+                self.views.append(0)
+                self.extras.append(None)
+                self.slot_by_id[video_id] = slot
+                bisect.insort(self.sorted_ids, video_id)
+            elif only_if_absent:
+                # Already applied from the change feed, which is at least as recent
+                return
+            self._write_slot(slot, video)
+
+    def remove(self, video_id: str):
+        """Remove one video, moving the last slot into the freed one"""
+        with self.lock:
+            if self.loading:
+                self.tombstones.add(video_id)
+            slot = self.slot_by_id.pop(video_id, None)
+            if slot is None:
+                return
+            last = len(self.ids) - 1
+            if slot != last:
+                self.ids[slot] = self.ids[last]
+                self.titles[slot] = self.titles[last]
+                self.descriptions[slot] = self.descriptions[last]
+                self.durations[slot] = self.durations[last]
+                self.genre_codes[slot] = self.genre_codes[last]
+                self.video_urls[slot] = self.video_urls[last]
+                self.views[slot] = self.views[last]
+                self.extras[slot] = self.extras[last]
+                self.slot_by_id[self.ids[slot]] = slot
+            for column in (self.ids, self.titles, self.descriptions, self.durations,
+                           self.genre_codes, self.video_urls, self.views, self.extras):
+                column.pop()
+            index = bisect.bisect_left(self.sorted_ids, video_id)
+            if index < len(self.sorted_ids) and self.sorted_ids[index] == video_id:
+                del self.sorted_ids[index]
+
+    def load(self, cursor):
+        """Fill the snapshot from a streaming cursor while change events keep arriving"""
+        with self.lock:
+            self.loading = True
+            self.tombstones.clear()
+        count = 0
+        try:
+            for video in cursor:
+                video["_id"] = str(video["_id"])
+                self.upsert(video, only_if_absent=True)
+                count += 1
+        finally:
+            with self.lock:
+                self.loading = False
+                self.tombstones.clear()
+        self.ready = True
+        logger.info(f"Catalog snapshot loaded with {count} videos ({len(self.genres)} genres)")
+
+    def get(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """Get one video by ID"""
+        with self.lock:
+            slot = self.slot_by_id.get(video_id)
+            return self._read_slot(slot) if slot is not None else None
+
+    def list(self, genre: str = None, limit: int = 50) -> list:
+        """List videos in creation order, optionally filtered by genre"""
+        with self.lock:
+            genre_code = None
+            if genre is not None:
+                genre_code = self.genre_index.get(genre)
+                if genre_code is None:
+                    return []
+            videos = []
+            for video_id in self.sorted_ids:
+                slot = self.slot_by_id[video_id]
+                if genre_code is not None and self.genre_codes[slot] != genre_code:
+                    continue
+                videos.append(self._read_slot(slot))
+                if len(videos) >= limit:
+                    break
+            return videos
+
+    def popular(self, limit: int = 10) -> list:
+        """Most viewed videos"""
+        with self.lock:
+            slots = heapq.nlargest(limit, range(len(self.ids)), key=self.views.__getitem__)
+            return [self._read_slot(slot) for slot in slots]
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot size information"""
+        with self.lock:
+            return {
+                "ready": self.ready,
+                "videos": len(self.ids),
+                "genres": len(self.genres)
+            }
@@ -57,23 +57,18 @@ export default function CatalogPage() {
     fetchVideos();
   }, []);
 
-  const handlePlay = async (video: Video) => {
+  // Views are counted by the streaming service from the bytes it serves,
+  // here we only reflect the new view locally.
+  const handlePlay = (video: Video) => {
     if (viewedVideos.current.has(video._id)) {
       return;
     }
-    try {
-      await fetch(`/api/catalog/videos/${video._id}/view`, {
-        method: "POST",
-      });
-      viewedVideos.current.add(video._id);
-      setVideos((currentVideos) =>
-        currentVideos.map((v) =>
-          v._id === video._id ? { ...v, views: (v.views || 0) + 1 } : v
-        )
-      );
-    } catch (error) {
-      console.error("Failed to increment view count:", error);
-    }
+    viewedVideos.current.add(video._id);
+    setVideos((currentVideos) =>
+      currentVideos.map((v) =>
+        v._id === video._id ? { ...v, views: (v.views || 0) + 1 } : v
+      )
+    );
   };
 
   // This function is called when a video finishes playing.
@@ -146,7 +141,7 @@ export default function CatalogPage() {
                       onPlay={() => handlePlay(video)}
                       onEnded={() => handleEnded(video._id)} // <-- ADD THIS EVENT HANDLER
                     >
-                      <source src={video.video_url} type="video/mp4" />
+                      <source src={`${video.video_url}?v=${video._id}`} type="video/mp4" />
                       Your browser does not support the video tag.
                     </video>
                   </div>
@@ -1,7 +1,18 @@
-from flask import Flask, Response, request, send_file, abort
+from flask import Flask, Response, request, abort
 from prometheus_flask_exporter import PrometheusMetrics
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from werkzeug.wsgi import ClosingIterator
+from file_cache import FileHandleCache
+from block_cache import BlockCache
+from ranges import plan_response
+from readahead import ReadaheadPrefetcher
+from local_tier import LocalTier
+from view_accounting import ViewAccounting
 import os
 import re
+import time
+import atexit
 import logging
 
 # Set up basic logging
@@ -13,63 +24,306 @@ metrics = PrometheusMetrics(app)
 
 VIDEO_DIR = os.environ.get("UPLOADS_DIR", "/app/uploads_data/videos")
 
-def generate_chunks(filepath, start, length):
+# Read size for the buffered fallback path (and block size hint for file wrappers)
+CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", str(256 * 1024)))
+# Let the WSGI server send Range bodies with sendfile when it supports it
+USE_SENDFILE = os.environ.get("STREAM_SENDFILE", "true").lower() == "true"
+
+# Open descriptors and stat metadata, revalidated with a stat every few seconds
+FD_BUDGET = int(os.environ.get("STREAM_FD_BUDGET", "256"))
+STAT_CHECK_INTERVAL = float(os.environ.get("STREAM_STAT_CHECK_INTERVAL", "5"))
+file_cache = FileHandleCache(VIDEO_DIR, max_fds=FD_BUDGET, check_interval=STAT_CHECK_INTERVAL)
+
+# Optional read-through copy of origin files on local disk (the shared volume is slow)
+LOCAL_CACHE_DIR = os.environ.get("LOCAL_CACHE_DIR", "")
+LOCAL_CACHE_MB = int(os.environ.get("LOCAL_CACHE_MB", "10240"))
+LOCAL_CACHE_FILL_WORKERS = int(os.environ.get("LOCAL_CACHE_FILL_WORKERS", "2"))
+local_tier = None
+if LOCAL_CACHE_DIR:
+    local_tier = LocalTier(LOCAL_CACHE_DIR, LOCAL_CACHE_MB * 1024 * 1024, fill_workers=LOCAL_CACHE_FILL_WORKERS,
+                           on_filled=file_cache.expire)
+    file_cache.tier = local_tier
+
+# In-memory cache of aligned file blocks (0 disables it)
+BLOCK_CACHE_MB = int(os.environ.get("STREAM_BLOCK_CACHE_MB", "64"))
+BLOCK_SIZE = int(os.environ.get("STREAM_BLOCK_SIZE_KB", "512")) * 1024
+BLOCK_CACHE_HEAD_BYTES = int(os.environ.get("STREAM_BLOCK_CACHE_HEAD_MB", "4")) * 1024 * 1024
+block_cache = BlockCache(BLOCK_CACHE_MB * 1024 * 1024, BLOCK_SIZE, BLOCK_CACHE_HEAD_BYTES) if BLOCK_CACHE_MB > 0 else None
+
+# Background prefetch of the next window for sequential viewers
+READAHEAD_ENABLED = os.environ.get("STREAM_READAHEAD", "true").lower() == "true"
+READAHEAD_WORKERS = int(os.environ.get("STREAM_READAHEAD_WORKERS", "2"))
+READAHEAD_MAX_WINDOW = int(os.environ.get("STREAM_READAHEAD_MAX_MB", "16")) * 1024 * 1024
+readahead = ReadaheadPrefetcher(file_cache, block_cache, workers=READAHEAD_WORKERS,
+                                max_window=READAHEAD_MAX_WINDOW) if READAHEAD_ENABLED else None
+
+# Views are counted here from playback sessions and sent to the catalog in batches
+VIEW_ACCOUNTING_ENABLED = os.environ.get("STREAM_VIEW_ACCOUNTING", "true").lower() == "true"
+CATALOG_VIEWS_URL = os.environ.get("CATALOG_VIEWS_URL", "http://catalog-service:5000/videos/views/batch")
+VIEW_MIN_BYTES = int(os.environ.get("VIEW_MIN_KB", "2048")) * 1024
+VIEW_SESSION_TTL = float(os.environ.get("VIEW_SESSION_TTL", "1800"))
+VIEW_FLUSH_INTERVAL = float(os.environ.get("VIEW_FLUSH_INTERVAL", "10"))
+view_accounting = None
+if VIEW_ACCOUNTING_ENABLED:
+    view_accounting = ViewAccounting(CATALOG_VIEWS_URL, min_bytes=VIEW_MIN_BYTES,
+                                     session_ttl=VIEW_SESSION_TTL, flush_interval=VIEW_FLUSH_INTERVAL)
+    view_accounting.start()
+    atexit.register(view_accounting.stop)
+
+# Streaming metrics, the generic Flask request metrics say little about long 206 responses
+# (the per-file counter has one series per title, so it is opt-in)
+PER_FILE_METRICS = os.environ.get("STREAM_PER_FILE_METRICS", "false").lower() == "true"
+BYTES_SENT = Counter("stream_bytes_sent_total", "Video bytes sent to clients")
+FILE_BYTES_SENT = Counter("stream_file_bytes_sent_total", "Video bytes sent to clients per file", ["file"])
+TIME_TO_FIRST_BYTE = Histogram("stream_time_to_first_byte_seconds",
+                               "Time from request start to the first body chunk (to the start of sendfile on that path)",
+                               buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+RANGE_SIZE = Histogram("stream_range_size_bytes", "Size of requested byte ranges",
+                       buckets=(64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2,
+                                64 * 1024 ** 2, 256 * 1024 ** 2, 1024 ** 3))
+ACTIVE_STREAMS = Gauge("stream_active_streams", "Response bodies currently being sent")
+CLIENT_ABORTS = Counter("stream_client_aborts_total", "Responses closed before the whole body was sent")
+
+class CacheCollector:
+    """Exports the descriptor and block cache counters at scrape time"""
+
+    def collect(self):
+        fd_stats = file_cache.stats()
+        fd_requests = CounterMetricFamily("stream_fd_cache_requests", "File metadata cache lookups", labels=["result"])
+        fd_requests.add_metric(["hit"], fd_stats["hits"])
+        fd_requests.add_metric(["miss"], fd_stats["misses"])
+        yield fd_requests
+        yield GaugeMetricFamily("stream_fd_cache_open_fds", "Open descriptors held by the cache", value=fd_stats["open_fds"])
+
+        if block_cache is not None:
+            block_stats = block_cache.stats()
+            block_requests = CounterMetricFamily("stream_block_cache_requests", "Block cache lookups", labels=["result"])
+            block_requests.add_metric(["hit"], block_stats["hits"])
+            block_requests.add_metric(["miss"], block_stats["misses"])
+            yield block_requests
+            yield GaugeMetricFamily("stream_block_cache_used_bytes", "Bytes of block cache in use",
+                                    value=block_stats["used_slots"] * block_stats["block_size"])
+
+        if local_tier is not None:
+            tier_stats = local_tier.stats()
+            tier_requests = CounterMetricFamily("stream_local_tier_requests", "Local tier lookups", labels=["result"])
+            tier_requests.add_metric(["hit"], tier_stats["hits"])
+            tier_requests.add_metric(["miss"], tier_stats["misses"])
+            yield tier_requests
+            yield CounterMetricFamily("stream_local_tier_fills", "Files copied from origin to the local tier",
+                                      value=tier_stats["fills"])
+            yield CounterMetricFamily("stream_local_tier_evictions", "Files evicted from the local tier",
+                                      value=tier_stats["evictions"])
+            yield GaugeMetricFamily("stream_local_tier_used_bytes", "Bytes of local tier in use",
+                                    value=tier_stats["used_bytes"])
+
+REGISTRY.register(CacheCollector())
+
+def record_sent(entry, start, sent, length, on_sent=None):
+    """Account the bytes of one finished (or aborted) body"""
+    if on_sent is not None:
+        on_sent(start, sent)
+    BYTES_SENT.inc(sent)
+    if PER_FILE_METRICS:
+        FILE_BYTES_SENT.labels(file=entry.filename).inc(sent)
+    if sent < length:
+        CLIENT_ABORTS.inc()
+
+# Catalog video the player is showing, passed as ?v=<id> (identical uploads share one file)
+VIDEO_ID_PATTERN = re.compile(r"^[0-9a-fA-F]{24}$")
+
+def view_recorder(viewer, entry, video_id):
+    """Callback feeding the bytes sent for one response into view accounting"""
+    if view_accounting is None or not video_id or not VIDEO_ID_PATTERN.match(video_id):
+        return None
+    return lambda start, sent: view_accounting.record(viewer, entry, video_id, start, sent)
+
+def client_id(headers, remote_addr):
+    """Viewer identity, nginx passes the real address in X-Real-IP"""
+    return headers.get('X-Real-IP') or remote_addr
+
+def use_block_cache(entry, start, length):
+    """Whole range servable from memory: it ends inside the cached head or all its blocks are resident
+
+    Longer ranges (full 200 responses, bytes=0-) keep the zero-copy path;
+    the block cache only ever fills with the head of a file.
+    """
+    if block_cache is None:
+        return False
+    if start + length <= BLOCK_CACHE_HEAD_BYTES:
+        return True
+    return all(block_cache.contains(entry.key, block_index)
+               for block_index in range(start // BLOCK_SIZE, (start + length - 1) // BLOCK_SIZE + 1))
+
+def read_chunks(f, start, length):
+    """Unbuffered reads: each read is a single syscall straight into the returned bytes"""
+    f.seek(start)
+    remaining = length
+    while remaining > 0:
+        chunk = f.read(CHUNK_SIZE if remaining > CHUNK_SIZE else remaining)
+        if not chunk:
+            break
+        yield chunk
+        remaining -= len(chunk)
+
+def cached_chunks(f, start, length):
+    """Head of the file through the block cache, resident blocks from it, the rest straight from the file
+
+    Only the part below BLOCK_CACHE_HEAD_BYTES is inserted, so a viewer
+    reading a whole title does not cycle it through the arena and evict the
+    head blocks every playback starts with.
+    """
+    key = f.entry.key
+    end = start + length
+    offset = start
+    while offset < end:
+        block_index = offset // BLOCK_SIZE
+        if offset < BLOCK_CACHE_HEAD_BYTES:
+            run_end = min(end, BLOCK_CACHE_HEAD_BYTES)
+            chunks = block_cache.read_range(key, f.fileno(), offset, run_end - offset)
+        elif block_cache.contains(key, block_index):
+            run_end = min(end, (block_index + 1) * BLOCK_SIZE)
+            chunks = block_cache.read_range(key, f.fileno(), offset, run_end - offset, fill=False)
+        else:
+            # Run of blocks that are not resident, read without touching the cache
+            next_block = block_index + 1
+            while next_block * BLOCK_SIZE < end and not block_cache.contains(key, next_block):
+                next_block += 1
+            run_end = min(end, next_block * BLOCK_SIZE)
+            chunks = read_chunks(f, offset, run_end - offset)
+        for chunk in chunks:
+            yield chunk
+            offset += len(chunk)
+        if offset < run_end:
+            break  # file is shorter than expected
+
+def generate_chunks(f, start, length, started_at=None, on_sent=None):
     """Yields chunks of the video file."""
+    sent = 0
+    ACTIVE_STREAMS.inc()
     try:
-        with open(filepath, 'rb') as f:
-            f.seek(start)
-            remaining = length
-            while remaining > 0:
-                chunk_size = 4096 if remaining > 4096 else remaining
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-                yield chunk
-                remaining -= len(chunk)
+        if block_cache is not None:
+            chunks = cached_chunks(f, start, length)
+        else:
+            chunks = read_chunks(f, start, length)
+        for chunk in chunks:
+            if sent == 0 and started_at is not None:
+                TIME_TO_FIRST_BYTE.observe(time.perf_counter() - started_at)
+            yield chunk
+            # Synchronous servers have written the chunk by the time we resume
+            sent += len(chunk)
     except Exception as e:
         logger.error(f"Error yielding video chunks: {e}")
+    finally:
+        ACTIVE_STREAMS.dec()
+        record_sent(f.entry, start, sent, length, on_sent)
+
+class SendfileSource:
+    """The file of one range as handed to gunicorn's sendfile, accounting what was sent
+
+    gunicorn rewinds the descriptor to the range start once sendfile
+    returns, so the offset cannot be read back from it afterwards.
+    socket.sendfile reports its progress by seeking this object to the end
+    of the bytes it sent (also when the client goes away mid-range), and
+    the fallback path reads through it; close() records the result.
+    """
+
+    def __init__(self, f, start, length, started_at=None, on_sent=None):
+        self.f = f
+        self.start = start
+        self.length = length
+        self.started_at = started_at
+        self.on_sent = on_sent
+        self.position = start
+        self.closed = False
+        f.seek(start)
+        ACTIVE_STREAMS.inc()
+
+    def _first_byte(self):
+        if self.started_at is not None:
+            TIME_TO_FIRST_BYTE.observe(time.perf_counter() - self.started_at)
+            self.started_at = None
+
+    def fileno(self):
+        # The server asks for the descriptor right before it starts sending
+        self._first_byte()
+        return self.f.fileno()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.position = self.f.seek(offset, whence)
+        return self.position
+
+    def read(self, size=-1):
+        self._first_byte()
+        data = self.f.read(size)
+        self.position += len(data)
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            ACTIVE_STREAMS.dec()
+            sent = min(self.length, max(0, self.position - self.start))
+            record_sent(self.f.entry, self.start, sent, self.length, self.on_sent)
+        finally:
+            self.f.close()
+
+def range_body(f, start, length, started_at=None, on_sent=None):
+    """Body for a byte range: zero-copy file wrapper when possible, buffered reads otherwise"""
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    # Gunicorn sends a wrapped file with sendfile from the current offset and stops at
+    # Content-Length; other servers may read the wrapper until EOF, so only trust gunicorn
+    if USE_SENDFILE and file_wrapper is not None and not use_block_cache(f.entry, start, length) and \
+            request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+        return file_wrapper(SendfileSource(f, start, length, started_at, on_sent), CHUNK_SIZE)
+    # The server closes the body even if it never iterates it, which hands the descriptor back
+    return ClosingIterator(generate_chunks(f, start, length, started_at, on_sent), f.close)
+
+def segments_body(f, segments, started_at=None, on_sent=None):
+    """Yields the parts of a multipart/byteranges body"""
+    for prefix, start, length in segments:
+        if prefix:
+            yield prefix
+        if length:
+            yield from generate_chunks(f, start, length, started_at, on_sent)
+            started_at = None
 
 @app.route('/stream/<filename>')
 def stream_video(filename):
-    video_path = os.path.join(VIDEO_DIR, filename)
-    logger.info(f"Attempting to stream video from path: {video_path}")
-
-    if not os.path.exists(video_path) or not os.path.isfile(video_path):
-        logger.error(f"Video file not found at path: {video_path}")
+    started_at = time.perf_counter()
+    # Descriptor and metadata come from the cache, no path lookups on a hit
+    f = file_cache.acquire(filename)
+    if f is None:
+        logger.error(f"Video file not found: {filename}")
         abort(404, description="Video not found")
 
-    file_size = os.path.getsize(video_path)
-    range_header = request.headers.get('Range', None)
-
-    if not range_header:
-        # If no Range header, send the whole file
-        return send_file(video_path, mimetype='video/mp4', as_attachment=False)
-
-    start_byte, end_byte = 0, None
-    match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-    if not match:
-        logger.error(f"Malformed Range header: {range_header}")
-        return "Malformed Range header", 400
-    
-    groups = match.groups()
-    start_byte = int(groups[0])
-    if groups[1]:
-        end_byte = int(groups[1])
-    
-    if end_byte is None or end_byte >= file_size:
-        end_byte = file_size - 1
-
-    length = end_byte - start_byte + 1
-
-    resp = Response(
-        generate_chunks(video_path, start_byte, length),
-        206,  # 206 Partial Content
-        mimetype='video/mp4',
-        direct_passthrough=True
-    )
-    resp.headers.add('Content-Range', f'bytes {start_byte}-{end_byte}/{file_size}')
-    resp.headers.add('Accept-Ranges', 'bytes')
-    resp.headers.add('Content-Length', str(length))
+    # Conditional headers, Range/If-Range, 304/412/416 and multipart ranges
+    plan = plan_response(request.method, request.headers.get, f.entry)
+    segments = plan["segments"]
+    if plan["status"] == 206:
+        for _, _, length in segments:
+            if length:
+                RANGE_SIZE.observe(length)
+
+    viewer = client_id(request.headers, request.remote_addr)
+    on_sent = view_recorder(viewer, f.entry, request.args.get('v'))
+    if not segments or request.method == 'HEAD':
+        f.close()
+        body = b""
+    elif len(segments) == 1:
+        # Whole file or a single range, eligible for sendfile
+        _, start, length = segments[0]
+        if readahead is not None and plan["status"] == 206:
+            readahead.observe(viewer, f.entry, start, length)
+        body = range_body(f, start, length, started_at, on_sent)
+    else:
+        body = ClosingIterator(segments_body(f, segments, started_at, on_sent), f.close)
+
+    resp = Response(body, plan["status"], direct_passthrough=True)
+    for name, value in plan["headers"]:
+        resp.headers[name] = value
     return resp
 
 if __name__ == '__main__':
@@ -0,0 +1,81 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from starlette.applications import Starlette
+from starlette.responses import Response, PlainTextResponse, StreamingResponse
+from starlette.routing import Route, Mount
+from prometheus_client import make_asgi_app
+
+# Shares the caches, response planning and chunk generator with the WSGI app
+from app import file_cache, segments_body, readahead, client_id, view_recorder, RANGE_SIZE
+from ranges import plan_response
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Blocking file work (open, stat, reads) runs on a small pool, the event loop only moves bytes
+IO_THREADS = int(os.environ.get("STREAM_IO_THREADS", "8"))
+io_pool = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="stream-io")
+
+async def run_io(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(io_pool, func, *args)
+
+async def file_body(f, segments, started_at, on_sent=None):
+    """Async body pulling one chunk at a time from the pool
+
+    Only one chunk per stream is in memory at a time: the next read starts
+    after the server has handed the previous chunk to a transport that is not
+    paused, so slow clients hold back their own reads.
+    """
+    chunks = segments_body(f, segments, started_at, on_sent)
+    try:
+        while True:
+            chunk = await run_io(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        await run_io(chunks.close)
+        await run_io(f.close)
+
+async def stream_video(request):
+    started_at = time.perf_counter()
+    filename = request.path_params["filename"]
+    f = await run_io(file_cache.acquire, filename)
+    if f is None:
+        logger.error(f"Video file not found: {filename}")
+        return PlainTextResponse("Video not found", 404)
+
+    plan = plan_response(request.method, request.headers.get, f.entry)
+    headers = dict(plan["headers"])
+    media_type = headers.pop("Content-Type", None)
+
+    if plan["status"] == 206:
+        for _, _, length in plan["segments"]:
+            if length:
+                RANGE_SIZE.observe(length)
+
+    if not plan["segments"] or request.method == "HEAD":
+        await run_io(f.close)
+        return Response(status_code=plan["status"], headers=headers, media_type=media_type)
+    
+    viewer = client_id(request.headers, request.client.host if request.client else None)
+    if readahead is not None and plan["status"] == 206 and len(plan["segments"]) == 1:
+        _, start, length = plan["segments"][0]
+        readahead.observe(viewer, f.entry, start, length)
+    body = file_body(f, plan["segments"], started_at,
+                     view_recorder(viewer, f.entry, request.query_params.get("v")))
+    return StreamingResponse(body, status_code=plan["status"],
+                             headers=headers, media_type=media_type)
+
+app = Starlette(routes=[
+    Route("/stream/{filename}", stream_video, methods=["GET", "HEAD"]),
+    Mount("/metrics", app=make_asgi_app())
+])
+
+if __name__ == "__main__":
+    import uvicorn
+    logger.info("Starting Streaming Service (asyncio mode)...")
+    uvicorn.run(app, host="0.0.0.0", port=5000, backlog=2048)
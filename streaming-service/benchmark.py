@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UALFlix Streaming Benchmark
+===========================
+
+Generates synthetic video files and drives the streaming service with
+concurrent simulated players (sequential range reads with occasional
+seeks). Reports throughput, TTFB percentiles and server CPU per GB served,
+and writes the results as JSON so runs can be compared.
+
+Examples:
+    python benchmark.py --server gunicorn --players 32 --output gunicorn.json
+    python benchmark.py --server async --env STREAM_BLOCK_CACHE_MB=0
+    python benchmark.py --server none --url http://localhost:5000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlparse
+from typing import Dict, List
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+def print_header(title: str):
+    print(f"\n{'='*60}")
+    print(f"UALFlix Streaming Benchmark: {title}")
+    print(f"{'='*60}")
+
+def print_section(title: str):
+    print(f"\n[INFO] {title}")
+    print("-" * 40)
+
+def generate_files(data_dir: str, count: int, size: int, seed: int) -> List[str]:
+    """Create (or reuse) synthetic video files of the requested size"""
+    os.makedirs(data_dir, exist_ok=True)
+    rng = random.Random(seed)
+    names = []
+    for index in range(count):
+        name = f"bench_{index:03d}.mp4"
+        path = os.path.join(data_dir, name)
+        names.append(name)
+        if os.path.exists(path) and os.path.getsize(path) == size:
+            continue
+        # A random 1 MiB pattern per file: incompressible and cheap to write
+        block = rng.randbytes(1024 * 1024)
+        with open(path, "wb") as f:
+            remaining = size
+            while remaining > 0:
+                f.write(block[:min(len(block), remaining)])
+                remaining -= len(block)
+    return names
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(kind: str, data_dir: str, extra_env: Dict[str, str]):
+    """Start the streaming service in the background, returns (url, process or None)"""
+    port = free_port()
+    env = dict(os.environ, UPLOADS_DIR=data_dir, **extra_env)
+
+    if kind == "inprocess":
+        os.environ.update(env)
+        sys.path.insert(0, SERVICE_DIR)
+        from werkzeug.serving import make_server
+        import app as streaming_app
+        server = make_server("127.0.0.1", port, streaming_app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{port}", None
+
+    if kind == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+                   "--worker-class", "gthread", "--workers", "1", "--threads", "32",
+                   "--log-level", "warning", "app:app"]
+    elif kind == "async":
+        command = [sys.executable, "-m", "uvicorn", "async_server:app", "--host", "127.0.0.1",
+                   "--port", str(port), "--log-level", "warning", "--no-access-log"]
+    else:
+        raise ValueError(f"Unknown server kind: {kind}")
+
+    process = subprocess.Popen(command, cwd=SERVICE_DIR, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return f"http://127.0.0.1:{port}", process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{kind} server did not start listening on port {port}")
+
+def process_tree_cpu(pid: int) -> float:
+    """User + system CPU seconds of a process and its live descendants (Linux /proc)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+
+    total = 0.0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / CLK_TCK
+        except OSError:
+            continue
+        pending.extend(children.get(current, []))
+    return total
+
+def server_cpu(process) -> float:
+    if process is None:
+        # In-process: includes the client threads as well
+        usage = os.times()
+        return usage.user + usage.system
+    return process_tree_cpu(process.pid)
+
+class Player(threading.Thread):
+    """One simulated viewer: sequential range requests with occasional seeks"""
+
+    def __init__(self, index: int, url: str, files: List[str], file_size: int, args, deadline: float):
+        super().__init__(daemon=True)
+        self.rng = random.Random(args.seed * 1000 + index)
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.prefix = parsed.path.rstrip("/")
+        self.files = files
+        self.file_size = file_size
+        self.args = args
+        self.deadline = deadline
+        self.conn = None
+        self.ttfb = []
+        self.latency = []
+        self.bytes = 0
+        self.requests = 0
+        self.errors = 0
+        self.buffer = bytearray(256 * 1024)
+
+    def pick_file(self) -> str:
+        # Zipf-like popularity: a few titles get most of the views
+        weights = [1.0 / (rank + 1) ** self.args.zipf for rank in range(len(self.files))]
+        return self.rng.choices(self.files, weights=weights)[0]
+
+    def fetch(self, name: str, start: int, end: int) -> bool:
+        """One range request, reading and discarding the body"""
+        expected = end - start + 1
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            began = time.perf_counter()
+            try:
+                self.conn.request("GET", f"{self.prefix}/stream/{name}", headers={"Range": f"bytes={start}-{end}"})
+                response = self.conn.getresponse()
+                received = response.readinto(memoryview(self.buffer)[:1])
+                first_byte = time.perf_counter()
+                while True:
+                    n = response.readinto(self.buffer)
+                    if not n:
+                        break
+                    received += n
+                done = time.perf_counter()
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    self.errors += 1
+                    return False
+                continue
+
+            self.requests += 1
+            self.bytes += received
+            if response.status != 206 or received != expected:
+                self.errors += 1
+                return False
+            self.ttfb.append(first_byte - began)
+            self.latency.append(done - began)
+            return True
+        return False
+
+    def play(self):
+        name = self.pick_file()
+        segment = self.args.segment_kb * 1024
+        offset = 0
+        for _ in range(self.args.segments_per_session):
+            if time.time() >= self.deadline:
+                return
+            if offset >= self.file_size or self.rng.random() < self.args.seek_probability:
+                offset = self.rng.randrange(0, self.file_size) // 4096 * 4096
+            end = min(self.file_size, offset + segment) - 1
+            if not self.fetch(name, offset, end):
+                return
+            offset = end + 1
+
+    def run(self):
+        for _ in range(self.args.sessions):
+            if time.time() >= self.deadline:
+                break
+            self.play()
+        if self.conn is not None:
+            self.conn.close()
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def run_benchmark(args) -> Dict:
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    data_dir = args.data_dir or os.path.join(tempfile.gettempdir(), "ualflix-bench")
+    file_size = args.file_size_mb * 1024 * 1024
+
+    print_section(f"Generating {args.files} files of {args.file_size_mb} MB in {data_dir}")
+    files = generate_files(data_dir, args.files, file_size, args.seed)
+
+    process = None
+    url = args.url
+    if args.server != "none":
+        print_section(f"Starting {args.server} server")
+        url, process = start_server(args.server, data_dir, extra_env)
+    print(f"   Target: {url}")
+
+    try:
+        if args.warmup:
+            print_section(f"Warm-up ({args.warmup}s)")
+            warm_args = argparse.Namespace(**dict(vars(args), sessions=1000000))
+            deadline = time.time() + args.warmup
+            warmers = [Player(i + 10000, url, files, file_size, warm_args, deadline) for i in range(args.players)]
+            for player in warmers:
+                player.start()
+            for player in warmers:
+                player.join()
+
+        print_section(f"Running {args.players} players")
+        cpu_before = server_cpu(process)
+        started = time.perf_counter()
+        deadline = time.time() + args.duration if args.duration else float("inf")
+        players = [Player(i, url, files, file_size, args, deadline) for i in range(args.players)]
+        for player in players:
+            player.start()
+        for player in players:
+            player.join()
+        elapsed = time.perf_counter() - started
+        cpu_used = server_cpu(process) - cpu_before
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    ttfb = [v for p in players for v in p.ttfb]
+    latency = [v for p in players for v in p.latency]
+    total_bytes = sum(p.bytes for p in players)
+    gigabytes = total_bytes / 1024 ** 3
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "server": args.server,
+            "url": url,
+            "players": args.players,
+            "sessions": args.sessions,
+            "segments_per_session": args.segments_per_session,
+            "segment_kb": args.segment_kb,
+            "seek_probability": args.seek_probability,
+            "files": args.files,
+            "file_size_mb": args.file_size_mb,
+            "seed": args.seed,
+            "env": extra_env
+        },
+        "results": {
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": sum(p.requests for p in players),
+            "errors": sum(p.errors for p in players),
+            "bytes": total_bytes,
+            "throughput_mb_s": round(total_bytes / 1024 ** 2 / elapsed, 2) if elapsed else 0.0,
+            "requests_per_second": round(len(latency) / elapsed, 2) if elapsed else 0.0,
+            "ttfb_ms": {
+                "p50": round(percentile(ttfb, 50) * 1000, 3),
+                "p95": round(percentile(ttfb, 95) * 1000, 3),
+                "p99": round(percentile(ttfb, 99) * 1000, 3)
+            },
+            "latency_ms": {
+                "p50": round(percentile(latency, 50) * 1000, 3),
+                "p95": round(percentile(latency, 95) * 1000, 3),
+                "p99": round(percentile(latency, 99) * 1000, 3)
+            },
+            "cpu_seconds": round(cpu_used, 3),
+            "cpu_seconds_per_gb": round(cpu_used / gigabytes, 3) if gigabytes else None,
+            "cpu_includes_client": process is None
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming service throughput benchmark")
+    parser.add_argument("--server", choices=["gunicorn", "async", "inprocess", "none"], default="gunicorn",
+                        help="server to start locally, or none to use --url")
+    parser.add_argument("--url", default="http://localhost:5000", help="service URL when --server none")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the started server (repeatable)")
+    parser.add_argument("--data-dir", help="directory for the synthetic files (reused between runs)")
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--file-size-mb", type=int, default=64)
+    parser.add_argument("--players", type=int, default=16)
+    parser.add_argument("--sessions", type=int, default=4, help="playback sessions per player")
+    parser.add_argument("--segments-per-session", type=int, default=32)
+    parser.add_argument("--segment-kb", type=int, default=1024, help="bytes requested per range")
+    parser.add_argument("--seek-probability", type=float, default=0.05)
+    parser.add_argument("--zipf", type=float, default=1.0, help="popularity skew between files")
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds (0 = no limit)")
+    parser.add_argument("--warmup", type=float, default=0, help="seconds of unmeasured load before the run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    print_header(f"{args.server} / {args.players} players")
+    report = run_benchmark(args)
+    results = report["results"]
+
+    print_section("Results")
+    print(f"   Requests:     {results['requests']} ({results['errors']} errors)")
+    print(f"   Throughput:   {results['throughput_mb_s']} MB/s, {results['requests_per_second']} req/s")
+    print(f"   TTFB (ms):    p50={results['ttfb_ms']['p50']} p95={results['ttfb_ms']['p95']} p99={results['ttfb_ms']['p99']}")
+    print(f"   CPU:          {results['cpu_seconds']}s ({results['cpu_seconds_per_gb']} s/GB)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[SUCCESS] Results written to {args.output}")
+    else:
+        print(json.dumps(report))
+
+    return 1 if results["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
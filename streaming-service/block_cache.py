@@ -0,0 +1,146 @@
+import os
+import mmap
+import threading
+import logging
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class BlockCache:
+    """Memory cache of fixed-size aligned file blocks in one preallocated mmap arena
+
+    Eviction is segmented LRU: new blocks enter a probation segment and are
+    promoted to the protected segment on their second hit, so one viewer
+    scanning a long title cannot push out blocks that many viewers share.
+    Blocks at the head of a file (where every playback starts) are promoted
+    straight away.
+    """
+
+    def __init__(self, budget_bytes: int, block_size: int = 512 * 1024,
+                 head_bytes: int = 4 * 1024 * 1024, protected_ratio: float = 0.8):
+        self.block_size = block_size
+        self.head_blocks = max(0, head_bytes // block_size)
+        self.slot_count = max(2, budget_bytes // block_size)
+        self.protected_limit = int(self.slot_count * protected_ratio)
+
+        # Anonymous mmap: pages are only committed once a slot is first written
+        self.arena = mmap.mmap(-1, self.slot_count * block_size)
+        self.view = memoryview(self.arena)
+
+        # (file_key, block_index) -> slot, in LRU order
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+        self.free_slots = list(range(self.slot_count - 1, -1, -1))
+        self.slot_length = [0] * self.slot_count
+        self.slot_pins = [0] * self.slot_count
+
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _promote(self, key, slot):
+        self.protected[key] = slot
+        # Demote the oldest protected blocks back to probation
+        while len(self.protected) > self.protected_limit:
+            old_key, old_slot = self.protected.popitem(last=False)
+            self.probation[old_key] = old_slot
+
+    def _allocate(self):
+        """Free slot, evicting the least recently used unpinned block if needed"""
+        if self.free_slots:
+            return self.free_slots.pop()
+        for segment in (self.probation, self.protected):
+            for key, slot in segment.items():
+                if not self.slot_pins[slot]:
+                    del segment[key]
+                    return slot
+        return None
+
+    def _pin(self, key):
+        """Look up a block and pin its slot so it is not reused while being copied"""
+        slot = self.probation.pop(key, None)
+        if slot is not None:
+            self._promote(key, slot)
+        else:
+            slot = self.protected.get(key)
+            if slot is None:
+                return None
+            self.protected.move_to_end(key)
+        self.slot_pins[slot] += 1
+        return slot
+
+    def contains(self, file_key, block_index: int) -> bool:
+        key = (file_key, block_index)
+        return key in self.protected or key in self.probation
+
+    def get_block(self, file_key, fd: int, block_index: int, fill: bool = True) -> bytes:
+        """Contents of one block, read from the file with pread on a miss
+
+        With fill unset a miss is read straight from the file and not
+        inserted, for callers that only want blocks that are already resident.
+        """
+        key = (file_key, block_index)
+        with self.lock:
+            slot = self._pin(key)
+            if slot is not None:
+                self.hits += 1
+        if slot is not None:
+            try:
+                return bytes(self.view[slot * self.block_size:slot * self.block_size + self.slot_length[slot]])
+            finally:
+                with self.lock:
+                    self.slot_pins[slot] -= 1
+
+        data = os.pread(fd, self.block_size, block_index * self.block_size)
+        if not fill:
+            return data
+        with self.lock:
+            self.misses += 1
+            # Another request may have filled the same block meanwhile
+            if key in self.protected or key in self.probation or not data:
+                return data
+            slot = self._allocate()
+            if slot is None:
+                return data
+            self.slot_pins[slot] += 1
+        try:
+            self.view[slot * self.block_size:slot * self.block_size + len(data)] = data
+            self.slot_length[slot] = len(data)
+        finally:
+            with self.lock:
+                self.slot_pins[slot] -= 1
+                if key in self.protected or key in self.probation:
+                    # Lost a race with a concurrent fill of the same block
+                    self.free_slots.append(slot)
+                elif block_index < self.head_blocks:
+                    self._promote(key, slot)
+                else:
+                    self.probation[key] = slot
+        return data
+
+    def read_range(self, file_key, fd: int, start: int, length: int, fill: bool = True):
+        """Yields the bytes of [start, start + length) assembled from cached blocks"""
+        end = start + length
+        offset = start
+        while offset < end:
+            block_index = offset // self.block_size
+            block = self.get_block(file_key, fd, block_index, fill)
+            block_start = block_index * self.block_size
+            if len(block) <= offset - block_start:
+                break  # file is shorter than expected
+            chunk = block[offset - block_start:min(len(block), end - block_start)]
+            # Whole blocks are yielded as-is, only range edges are sliced
+            yield chunk
+            offset += len(chunk)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "block_size": self.block_size,
+                "slots": self.slot_count,
+                "used_slots": len(self.probation) + len(self.protected),
+                "protected": len(self.protected),
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,251 @@
+import io
+import os
+import stat
+import time
+import mimetypes
+import threading
+import logging
+from collections import OrderedDict
+from storage_layout import candidate_paths
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# mimetypes does not know these on slim images without /etc/mime.types
+VIDEO_MIME_TYPES = {
+    ".mp4": "video/mp4",
+    ".m4v": "video/mp4",
+    ".mov": "video/quicktime",
+    ".mkv": "video/x-matroska",
+    ".avi": "video/x-msvideo",
+    ".webm": "video/webm"
+}
+
+def guess_mimetype(filename: str) -> str:
+    """MIME type from the file extension"""
+    ext = os.path.splitext(filename)[1].lower()
+    return VIDEO_MIME_TYPES.get(ext) or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+class FileEntry:
+    """Stat metadata and idle descriptors for one video file
+
+    Metadata (size, ETag, cache keys) always comes from the origin file;
+    path is where descriptors are opened, which may be a local tier copy.
+    """
+
+    def __init__(self, filename: str, path: str, st: os.stat_result):
+        self.filename = filename
+        self.path = path
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.mtime_ns = st.st_mtime_ns
+        self.inode = (st.st_dev, st.st_ino)
+        # Identifies this version of the file in other caches
+        self.key = (st.st_dev, st.st_ino, st.st_mtime_ns)
+        self.etag = f'"{self.size:x}-{self.mtime_ns:x}"'
+        self.mimetype = guess_mimetype(filename)
+        self.checked_at = time.monotonic()
+        self.free_fds = []
+        self.in_use = 0
+        self.stale = False
+
+    def matches(self, st: os.stat_result) -> bool:
+        return (st.st_dev, st.st_ino) == self.inode and st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+class CachedFile(io.RawIOBase):
+    """A descriptor checked out of the cache for one response, handed back on close"""
+
+    def __init__(self, cache, entry: FileEntry, fd: int):
+        super().__init__()
+        self.cache = cache
+        self.entry = entry
+        self.fd = fd
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return os.lseek(self.fd, offset, whence)
+
+    def tell(self) -> int:
+        return os.lseek(self.fd, 0, os.SEEK_CUR)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = max(0, self.entry.size - self.tell())
+        return os.read(self.fd, size)
+
+    def readinto(self, buffer) -> int:
+        data = os.read(self.fd, len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.cache.release(self.entry, self.fd)
+        super().close()
+
+class FileHandleCache:
+    """LRU cache of open descriptors and stat metadata for video files
+
+    Each descriptor is used by one response at a time, so its file offset is
+    private to that response (sendfile reads the offset from the descriptor).
+    """
+
+    def __init__(self, base_dir: str, max_fds: int = 256, check_interval: float = 5.0, tier=None):
+        self.base_dir = base_dir
+        self.max_fds = max_fds
+        self.check_interval = check_interval
+        self.tier = tier
+        self.entries = OrderedDict()
+        self.open_fds = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _stat(self, path: str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st if stat.S_ISREG(st.st_mode) else None
+
+    def _find(self, filename: str):
+        """Path and stat of a file in the hashed layout or, while migrating, the flat one"""
+        paths = candidate_paths(self.base_dir, filename)
+        # A file renamed between the two stats is found by the second pass
+        for path in paths + paths[:1]:
+            st = self._stat(path)
+            if st is not None:
+                return path, st
+        return None, None
+
+    def _drop(self, entry: FileEntry):
+        """Forget an entry; descriptors still in use are closed on release"""
+        entry.stale = True
+        self.entries.pop(entry.filename, None)
+        while entry.free_fds:
+            os.close(entry.free_fds.pop())
+            self.open_fds -= 1
+
+    def _evict(self):
+        """Close idle descriptors of the least recently used files until within budget"""
+        for entry in list(self.entries.values()):
+            if self.open_fds <= self.max_fds:
+                break
+            while entry.free_fds and self.open_fds > self.max_fds:
+                os.close(entry.free_fds.pop())
+                self.open_fds -= 1
+            if not entry.free_fds and not entry.in_use:
+                self.entries.pop(entry.filename, None)
+
+    def lookup(self, filename: str, path: str = None):
+        """Metadata for a file, revalidated with a stat at most every check_interval"""
+        with self.lock:
+            entry = self.entries.get(filename)
+            now = time.monotonic()
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                self.entries.move_to_end(filename)
+                self.hits += 1
+                return entry
+
+        if path:
+            st = self._stat(path)
+        else:
+            path, st = self._find(filename)
+        if st is not None and self.tier is not None:
+            path = self.tier.resolve(filename, path, st)
+
+        with self.lock:
+            entry = self.entries.get(filename)
+            if entry is not None and st is not None and entry.matches(st):
+                if entry.path != path:
+                    # Moved to the other layout or now in the local tier: open new descriptors there
+                    entry.path = path
+                    while entry.free_fds:
+                        os.close(entry.free_fds.pop())
+                        self.open_fds -= 1
+                entry.checked_at = time.monotonic()
+                self.entries.move_to_end(filename)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                logger.info(f"File {filename} changed or removed, dropping cached descriptors")
+                self._drop(entry)
+            self.misses += 1
+            if st is None:
+                return None
+            entry = FileEntry(filename, path, st)
+            self.entries[filename] = entry
+            return entry
+
+    def expire(self, filename: str):
+        """Revalidate a file on its next lookup (e.g. after a local tier fill)"""
+        with self.lock:
+            entry = self.entries.get(filename)
+            if entry is not None:
+                entry.checked_at = 0.0
+
+    def acquire(self, filename: str, path: str = None):
+        """Check out a descriptor for a file, or None if it does not exist"""
+        entry = self.lookup(filename, path)
+        if entry is None:
+            return None
+
+        with self.lock:
+            if entry.free_fds:
+                entry.in_use += 1
+                return CachedFile(self, entry, entry.free_fds.pop())
+
+        try:
+            fd = os.open(entry.path, os.O_RDONLY)
+        except FileNotFoundError:
+            if path:
+                return None
+            # Moved (e.g. by the layout migration) since it was last checked: look it up again
+            entry.checked_at = 0.0
+            entry = self.lookup(filename)
+            if entry is None:
+                return None
+            try:
+                fd = os.open(entry.path, os.O_RDONLY)
+            except OSError as e:
+                logger.error(f"Could not open {entry.path}: {e}")
+                return None
+        except OSError as e:
+            logger.error(f"Could not open {entry.path}: {e}")
+            return None
+
+        with self.lock:
+            entry.in_use += 1
+            self.open_fds += 1
+            self._evict()
+        return CachedFile(self, entry, fd)
+
+    def release(self, entry: FileEntry, fd: int):
+        """Return a descriptor to the cache, closing it if the file changed or we are over budget"""
+        with self.lock:
+            entry.in_use -= 1
+            if entry.stale or self.open_fds > self.max_fds:
+                os.close(fd)
+                self.open_fds -= 1
+                if not entry.free_fds and not entry.in_use and self.entries.get(entry.filename) is entry:
+                    self.entries.pop(entry.filename)
+            else:
+                entry.free_fds.append(fd)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "files": len(self.entries),
+                "open_fds": self.open_fds,
+                "max_fds": self.max_fds,
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,172 @@
+import os
+import shutil
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from storage_layout import sharded_path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PART_SUFFIX = ".part"
+
+class LocalTier:
+    """Read-through copy of origin video files on fast local disk
+
+    The origin (the shared volume) stays the source of truth: a local copy
+    is only used while its size and mtime match the origin file, which the
+    fill sets with utime. Copies are filled in the background, one fill per
+    file however many viewers ask for it, and evicted least recently used
+    once the size budget is exceeded.
+    """
+
+    def __init__(self, cache_dir: str, budget_bytes: int, fill_workers: int = 2,
+                 max_file_ratio: float = 0.25, on_filled=None):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        # One title must not be able to flush the whole tier
+        self.max_file_bytes = int(budget_bytes * max_file_ratio)
+        self.on_filled = on_filled
+
+        self.files = OrderedDict()  # filename -> size, in LRU order
+        self.used = 0
+        self.filling = set()
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=fill_workers, thread_name_prefix="tier-fill")
+
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.fill_errors = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Index copies left by a previous run and remove interrupted fills"""
+        found = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    if name.endswith(PART_SUFFIX):
+                        os.remove(path)
+                        continue
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_ctime, name, st.st_size))
+        for _, name, size in sorted(found):
+            self.files[name] = size
+            self.used += size
+        self._evict(0)
+        if found:
+            logger.info(f"Local tier has {len(self.files)} files ({self.used // (1024 * 1024)} MB)")
+
+    def _local_path(self, filename: str) -> str:
+        return sharded_path(self.cache_dir, filename)
+
+    def _evict(self, needed: int):
+        """Remove least recently used copies until needed bytes fit (caller holds the lock)"""
+        while self.files and self.used + needed > self.budget_bytes:
+            filename, size = self.files.popitem(last=False)
+            self.used -= size
+            self.evictions += 1
+            try:
+                # Open descriptors keep reading the unlinked file until they are closed
+                os.remove(self._local_path(filename))
+            except OSError as e:
+                logger.error(f"Could not evict {filename} from the local tier: {e}")
+
+    def resolve(self, filename: str, origin_path: str, st: os.stat_result) -> str:
+        """Path to read a file from: the local copy when current, otherwise origin (and start a fill)"""
+        local_path = self._local_path(filename)
+        with self.lock:
+            cached = filename in self.files
+            if cached:
+                self.files.move_to_end(filename)
+        if cached:
+            try:
+                local = os.stat(local_path)
+                if local.st_size == st.st_size and local.st_mtime_ns == st.st_mtime_ns:
+                    with self.lock:
+                        self.hits += 1
+                    return local_path
+            except OSError:
+                pass
+            # Outdated or gone: forget it, a fresh fill replaces it
+            self._forget(filename)
+
+        with self.lock:
+            self.misses += 1
+            if filename in self.filling or st.st_size > self.max_file_bytes:
+                return origin_path
+            self.filling.add(filename)
+        self.pool.submit(self._fill, filename, origin_path, st)
+        return origin_path
+
+    def _forget(self, filename: str):
+        with self.lock:
+            size = self.files.pop(filename, None)
+            if size is None:
+                return
+            self.used -= size
+        try:
+            os.remove(self._local_path(filename))
+        except OSError:
+            pass
+
+    def _fill(self, filename: str, origin_path: str, st: os.stat_result):
+        local_path = self._local_path(filename)
+        part_path = local_path + PART_SUFFIX
+        try:
+            with self.lock:
+                # Reserve the space up front so concurrent fills do not overshoot the budget
+                self._evict(st.st_size)
+                self.used += st.st_size
+            try:
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                # copyfile uses sendfile on Linux, no user-space buffers
+                shutil.copyfile(origin_path, part_path)
+                os.utime(part_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+                now = os.stat(origin_path)
+                if now.st_size != st.st_size or now.st_mtime_ns != st.st_mtime_ns:
+                    raise RuntimeError("origin file changed during the fill")
+                os.rename(part_path, local_path)
+            except Exception:
+                with self.lock:
+                    self.used -= st.st_size
+                raise
+            with self.lock:
+                self.files[filename] = st.st_size
+                self.fills += 1
+            logger.info(f"Filled {filename} into the local tier ({st.st_size} bytes)")
+            if self.on_filled is not None:
+                self.on_filled(filename)
+        except Exception as e:
+            with self.lock:
+                self.fill_errors += 1
+            logger.error(f"Local tier fill of {filename} failed: {e}")
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+        finally:
+            with self.lock:
+                self.filling.discard(filename)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "files": len(self.files),
+                "used_bytes": self.used,
+                "budget_bytes": self.budget_bytes,
+                "filling": len(self.filling),
+                "hits": self.hits,
+                "misses": self.misses,
+                "fills": self.fills,
+                "fill_errors": self.fill_errors,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,167 @@
+import uuid
+from email.utils import parsedate_to_datetime
+from werkzeug.http import http_date
+
+# Ranges closer than this are merged into one part (a multipart header costs about as much)
+COALESCE_GAP = 128
+# More parts than this after coalescing is treated as abuse and answered with the full file
+MAX_RANGES = 32
+
+def parse_range_header(value: str, size: int):
+    """Satisfiable (start, end) pairs of a Range header (RFC 7233)
+
+    Returns None when the header must be ignored (unknown unit or invalid
+    syntax) and an empty list when no range is satisfiable.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        first, last = first.strip(), last.strip()
+        if not dash or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # Suffix range: the last N bytes
+            if not last:
+                return None
+            suffix = int(last)
+            if suffix > 0 and size > 0:
+                ranges.append((max(0, size - suffix), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < size:
+            end = int(last) if last else size - 1
+            ranges.append((start, min(end, size - 1)))
+    return ranges
+
+def coalesce(ranges: list, gap: int = COALESCE_GAP) -> list:
+    """Sort ranges and merge the ones that overlap or are close together"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1 + gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def _parse_date(value: str):
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def _etags(value: str) -> list:
+    return [tag.strip() for tag in value.split(",") if tag.strip()]
+
+def etag_matches(value: str, etag: str, weak: bool = True) -> bool:
+    """If-Match / If-None-Match style comparison against our (strong) ETag"""
+    for tag in _etags(value):
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            if weak and tag[2:] == etag:
+                return True
+        elif tag == etag:
+            return True
+    return False
+
+def check_preconditions(method: str, get_header, etag: str, mtime: float):
+    """Evaluate conditional headers in RFC 7232 section 6 order: None, 304 or 412"""
+    last_modified = int(mtime)
+
+    if_match = get_header("If-Match")
+    if if_match:
+        if not etag_matches(if_match, etag, weak=False):
+            return 412
+    else:
+        since = _parse_date(get_header("If-Unmodified-Since") or "")
+        if since is not None and last_modified > since:
+            return 412
+
+    if_none_match = get_header("If-None-Match")
+    if if_none_match:
+        if etag_matches(if_none_match, etag):
+            return 304 if method in ("GET", "HEAD") else 412
+    elif method in ("GET", "HEAD"):
+        since = _parse_date(get_header("If-Modified-Since") or "")
+        if since is not None and last_modified <= since:
+            return 304
+    return None
+
+def if_range_allows(value: str, etag: str, mtime: float) -> bool:
+    """If-Range: the Range applies only if the representation is unchanged"""
+    value = value.strip()
+    if value.startswith('"') or value.startswith("W/"):
+        # Strong comparison, weak validators never match
+        return value == etag
+    return _parse_date(value) == int(mtime)
+
+def plan_response(method: str, get_header, entry) -> dict:
+    """Status, headers and body segments for a GET/HEAD of a file entry
+
+    Segments are (prefix_bytes, start, length): the prefix is written
+    before the file bytes (multipart part headers, closing delimiter).
+    """
+    size = entry.size
+    headers = [
+        ("Accept-Ranges", "bytes"),
+        ("ETag", entry.etag),
+        ("Last-Modified", http_date(entry.mtime))
+    ]
+
+    status = check_preconditions(method, get_header, entry.etag, entry.mtime)
+    if status is not None:
+        return {"status": status, "headers": headers, "segments": []}
+
+    ranges = None
+    range_header = get_header("Range")
+    if range_header:
+        if_range = get_header("If-Range")
+        if not if_range or if_range_allows(if_range, entry.etag, entry.mtime):
+            ranges = parse_range_header(range_header, size)
+
+    if ranges is not None and not ranges:
+        headers.append(("Content-Range", f"bytes */{size}"))
+        headers.append(("Content-Length", "0"))
+        return {"status": 416, "headers": headers, "segments": []}
+
+    if ranges is not None:
+        ranges = coalesce(ranges)
+        if len(ranges) > MAX_RANGES:
+            ranges = None
+
+    if ranges is None:
+        headers.append(("Content-Type", entry.mimetype))
+        headers.append(("Content-Length", str(size)))
+        return {"status": 200, "headers": headers, "segments": [(b"", 0, size)]}
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers.append(("Content-Type", entry.mimetype))
+        headers.append(("Content-Range", f"bytes {start}-{end}/{size}"))
+        headers.append(("Content-Length", str(end - start + 1)))
+        return {"status": 206, "headers": headers, "segments": [(b"", start, end - start + 1)]}
+
+    boundary = uuid.uuid4().hex
+    segments = []
+    for index, (start, end) in enumerate(ranges):
+        # The CRLF before each delimiter belongs to the delimiter, not to the previous part
+        delimiter = "--" if index == 0 else "\r\n--"
+        part_header = (f"{delimiter}{boundary}\r\n"
+                       f"Content-Type: {entry.mimetype}\r\n"
+                       f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n")
+        segments.append((part_header.encode("ascii"), start, end - start + 1))
+    segments.append((f"\r\n--{boundary}--\r\n".encode("ascii"), 0, 0))
+
+    content_length = sum(len(prefix) + length for prefix, _, length in segments)
+    headers.append(("Content-Type", f"multipart/byteranges; boundary={boundary}"))
+    headers.append(("Content-Length", str(content_length)))
+    return {"status": 206, "headers": headers, "segments": segments}
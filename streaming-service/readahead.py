@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class AccessState:
+    """Recent range requests of one client on one file"""
+
+    def __init__(self, window: int):
+        self.next_offset = None
+        self.last_seen = 0.0
+        self.window = window
+        self.rate = 0.0  # bytes per second, exponentially smoothed
+        self.prefetched_until = 0
+
+class ReadaheadPrefetcher:
+    """Detects sequential range requests and prefetches the next window in the background
+
+    The window starts at min_window, doubles on every sequential request and
+    is capped by max_window and by what the client consumes in
+    lookahead_seconds at its observed rate. A seek resets it.
+    """
+
+    def __init__(self, file_cache, block_cache=None, workers: int = 2, min_window: int = 1024 * 1024,
+                 max_window: int = 16 * 1024 * 1024, lookahead_seconds: float = 10.0,
+                 max_sessions: int = 10000, session_ttl: float = 60.0):
+        self.file_cache = file_cache
+        self.block_cache = block_cache
+        self.min_window = min_window
+        self.max_window = max_window
+        self.lookahead_seconds = lookahead_seconds
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="readahead")
+        # Drop prefetches instead of queueing them when the pool is saturated
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.prefetches = 0
+        self.skipped = 0
+
+    def _state(self, key, now: float) -> AccessState:
+        state = self.sessions.pop(key, None)
+        if state is None or now - state.last_seen > self.session_ttl:
+            state = AccessState(self.min_window)
+        self.sessions[key] = state
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return state
+
+    def observe(self, client_id: str, entry, start: int, length: int):
+        """Record a range request and prefetch what follows it if access looks sequential
+
+        Open-ended ranges (bytes=N-, which browsers send for media) resolve
+        to the end of the file; the response itself reads them front to
+        back, so the window is prefetched just ahead of where it starts.
+        """
+        end = min(start + length, entry.size)
+        to_eof = end >= entry.size
+        now = time.monotonic()
+        with self.lock:
+            state = self._state((client_id, entry.key), now)
+            sequential = state.next_offset is not None and \
+                state.next_offset - self.min_window <= start <= state.next_offset + self.min_window
+
+            if sequential:
+                elapsed = now - state.last_seen
+                if elapsed > 0 and not to_eof:
+                    rate = length / elapsed
+                    state.rate = rate if not state.rate else 0.7 * state.rate + 0.3 * rate
+                window = state.window * 2
+                if state.rate:
+                    window = min(window, max(self.min_window, int(state.rate * self.lookahead_seconds)))
+                state.window = max(self.min_window, min(window, self.max_window))
+            else:
+                state.window = self.min_window
+                state.rate = 0.0
+                state.prefetched_until = 0
+
+            state.next_offset = end
+            state.last_seen = now
+
+            if not sequential and not to_eof:
+                return
+            ahead = min(end, start + self.min_window) if to_eof else end
+            prefetch_start = max(ahead, state.prefetched_until)
+            prefetch_end = min(entry.size, ahead + state.window)
+            if prefetch_start >= prefetch_end:
+                return
+            state.prefetched_until = prefetch_end
+
+        if not self.slots.acquire(blocking=False):
+            self.skipped += 1
+            return
+        self.prefetches += 1
+        self.pool.submit(self._prefetch, entry, prefetch_start, prefetch_end - prefetch_start)
+
+    def _prefetch(self, entry, start: int, length: int):
+        try:
+            f = self.file_cache.acquire(entry.filename)
+            if f is None:
+                return
+            try:
+                if self.block_cache is not None:
+                    # The arena only holds file heads; past them the page cache does the caching
+                    block_size = self.block_cache.block_size
+                    head_end = min(start + length, self.block_cache.head_blocks * block_size)
+                    for block_index in range(start // block_size, (head_end - 1) // block_size + 1):
+                        if not self.block_cache.contains(f.entry.key, block_index):
+                            self.block_cache.get_block(f.entry.key, f.fileno(), block_index)
+                    length -= max(0, head_end - start)
+                    start = max(start, head_end)
+                if length > 0 and hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), start, length, os.POSIX_FADV_WILLNEED)
+            finally:
+                f.close()
+        except Exception as e:
+            logger.error(f"Readahead of {entry.filename} failed: {e}")
+        finally:
+            self.slots.release()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "prefetches": self.prefetches,
+                "skipped": self.skipped
+            }
@@ -0,0 +1,157 @@
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+import requests
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class PlaybackSession:
+    """Bytes one client has been served from one file"""
+
+    def __init__(self):
+        self.bytes_served = 0
+        self.furthest = 0
+        self.counted = False
+        self.last_seen = 0.0
+
+class ViewAccounting:
+    """Counts views from playback sessions and pushes them to the catalog in batches
+
+    A session is one client playing one catalog video; it counts as a view
+    once it has been served min_bytes (or the whole file, if smaller). A new
+    session starts after session_ttl of inactivity, or when a client that
+    already reached the end of the file starts again from the beginning.
+    Views are attributed by catalog video id, as several catalog entries
+    can share one stored file.
+
+    Counts that fail to send are retried on the next max_retries flushes and
+    then dropped; counts the catalog rejects (4xx) are dropped straight away.
+    """
+
+    def __init__(self, catalog_url: str, min_bytes: int = 2 * 1024 * 1024,
+                 session_ttl: float = 1800.0, flush_interval: float = 10.0,
+                 max_sessions: int = 100000, max_batch: int = 1000, timeout: float = 5.0,
+                 max_retries: int = 3, max_pending: int = 10000):
+        self.catalog_url = catalog_url
+        self.min_bytes = min_bytes
+        self.session_ttl = session_ttl
+        self.flush_interval = flush_interval
+        self.max_sessions = max_sessions
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_pending = max_pending
+
+        self.sessions = OrderedDict()
+        self.pending = {}  # video id -> views not yet sent
+        self.attempts = {}  # video id -> failed sends of its pending views
+        self.lock = threading.Lock()
+        self.http = requests.Session()
+        self.views_counted = 0
+        self.views_sent = 0
+        self.flush_errors = 0
+        self.views_dropped = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def record(self, client_id: str, entry, video_id: str, start: int, sent: int):
+        """Account bytes served to a client, called when a response body is closed"""
+        if sent <= 0:
+            return
+        key = (client_id, video_id)
+        now = time.monotonic()
+        with self.lock:
+            session = self.sessions.pop(key, None)
+            restarted = session is not None and session.counted and start == 0 and \
+                session.furthest >= entry.size
+            if session is None or restarted or now - session.last_seen > self.session_ttl:
+                session = PlaybackSession()
+            self.sessions[key] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+            session.last_seen = now
+            session.bytes_served += sent
+            session.furthest = max(session.furthest, start + sent)
+            if not session.counted and session.bytes_served >= min(self.min_bytes, entry.size):
+                session.counted = True
+                self.views_counted += 1
+                if video_id in self.pending or len(self.pending) < self.max_pending:
+                    self.pending[video_id] = self.pending.get(video_id, 0) + 1
+                else:
+                    self.views_dropped += 1
+
+    def flush(self):
+        """Send pending views to the catalog in one call per batch"""
+        with self.lock:
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, {}
+            attempts, self.attempts = self.attempts, {}
+
+        items = list(pending.items())
+        for offset in range(0, len(items), self.max_batch):
+            batch = items[offset:offset + self.max_batch]
+            payload = {"increments": [{"video_id": video_id, "count": count} for video_id, count in batch]}
+            try:
+                response = self.http.post(self.catalog_url, json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                self.views_sent += sum(count for _, count in batch)
+                unmatched = response.json().get("unmatched") or []
+                if unmatched:
+                    logger.warning(f"Views for {len(unmatched)} videos not in the catalog were dropped")
+            except Exception as e:
+                self.flush_errors += 1
+                logger.error(f"Failed to send {len(batch)} view counts to the catalog: {e}")
+                response = getattr(e, "response", None)
+                retry = response is None or response.status_code >= 500
+                dropped = 0
+                with self.lock:
+                    for video_id, count in batch:
+                        # Keep the counts for a few more flushes, unless the backlog is already too big
+                        tries = attempts.get(video_id, 0) + 1
+                        if retry and tries <= self.max_retries and \
+                                (video_id in self.pending or len(self.pending) < self.max_pending):
+                            self.pending[video_id] = self.pending.get(video_id, 0) + count
+                            self.attempts[video_id] = tries
+                        else:
+                            dropped += count
+                    self.views_dropped += dropped
+                if dropped:
+                    logger.warning(f"Dropped {dropped} view counts the catalog did not accept")
+
+    def _worker(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+            with self.lock:
+                # Drop sessions that can no longer count or continue
+                cutoff = time.monotonic() - self.session_ttl
+                while self.sessions:
+                    key, session = next(iter(self.sessions.items()))
+                    if session.last_seen >= cutoff:
+                        break
+                    self.sessions.popitem(last=False)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._worker, name="view-accounting", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop the background thread and send what is left"""
+        self.stopped.set()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "pending_videos": len(self.pending),
+                "views_counted": self.views_counted,
+                "views_sent": self.views_sent,
+                "flush_errors": self.flush_errors,
+                "views_dropped": self.views_dropped
+            }
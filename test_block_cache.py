@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Streaming service: segmented LRU block cache (block_cache.py)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "streaming-service"))
+from block_cache import BlockCache
+
+BLOCK = 1024
+KEY = ("dev", "ino", 1)
+
+def open_file(tmp_path, size=16 * BLOCK):
+    data = os.urandom(size)
+    path = tmp_path / "movie.mp4"
+    path.write_bytes(data)
+    return os.open(path, os.O_RDONLY), data
+
+def test_read_range_matches_the_file_and_hits_on_reread(tmp_path):
+    fd, data = open_file(tmp_path)
+    cache = BlockCache(8 * BLOCK, block_size=BLOCK, head_bytes=2 * BLOCK)
+    assert b"".join(cache.read_range(KEY, fd, 100, 3000)) == data[100:3100]
+    misses = cache.stats()["misses"]
+    assert b"".join(cache.read_range(KEY, fd, 100, 3000)) == data[100:3100]
+    assert cache.stats()["misses"] == misses
+    assert cache.stats()["hits"] >= 3
+    os.close(fd)
+
+def test_read_range_stops_at_end_of_file(tmp_path):
+    fd, data = open_file(tmp_path, size=2 * BLOCK + 10)
+    cache = BlockCache(8 * BLOCK, block_size=BLOCK)
+    assert b"".join(cache.read_range(KEY, fd, 2 * BLOCK, 5 * BLOCK)) == data[2 * BLOCK:]
+    os.close(fd)
+
+def test_fill_unset_does_not_insert(tmp_path):
+    fd, data = open_file(tmp_path)
+    cache = BlockCache(8 * BLOCK, block_size=BLOCK)
+    assert cache.get_block(KEY, fd, 3, fill=False) == data[3 * BLOCK:4 * BLOCK]
+    assert not cache.contains(KEY, 3)
+    os.close(fd)
+
+def test_head_blocks_survive_a_scan(tmp_path):
+    fd, _ = open_file(tmp_path, size=64 * BLOCK)
+    cache = BlockCache(8 * BLOCK, block_size=BLOCK, head_bytes=2 * BLOCK)
+    for block_index in range(2):
+        cache.get_block(KEY, fd, block_index)
+    # A long scan only cycles through probation
+    for block_index in range(2, 64):
+        cache.get_block(KEY, fd, block_index)
+    assert cache.contains(KEY, 0) and cache.contains(KEY, 1)
+    assert cache.stats()["used_slots"] <= 8
+    os.close(fd)
+
+def test_blocks_read_twice_are_protected(tmp_path):
+    fd, _ = open_file(tmp_path, size=64 * BLOCK)
+    cache = BlockCache(8 * BLOCK, block_size=BLOCK, head_bytes=0)
+    cache.get_block(KEY, fd, 10)
+    cache.get_block(KEY, fd, 10)
+    for block_index in range(20, 60):
+        cache.get_block(KEY, fd, block_index)
+    assert cache.contains(KEY, 10)
+    os.close(fd)
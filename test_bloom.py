@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Catalog service: counting Bloom filter of video IDs (bloom.py)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog-service"))
+from bloom import CountingBloomFilter
+
+def test_added_keys_are_always_found():
+    bloom = CountingBloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f"video-{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert bloom.stats()["items"] == 1000
+
+def test_false_positive_rate_is_near_the_target():
+    bloom = CountingBloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"video-{i}")
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_removed_key_is_gone_and_others_stay():
+    bloom = CountingBloomFilter(capacity=100)
+    bloom.add("a")
+    bloom.add("b")
+    bloom.remove("a")
+    assert "a" not in bloom
+    assert "b" in bloom
+    assert bloom.stats()["items"] == 1
+
+def test_removing_an_absent_key_changes_nothing():
+    bloom = CountingBloomFilter(capacity=100)
+    bloom.add("a")
+    counters = bytes(bloom.counters)
+    bloom.remove("never-added")
+    assert bytes(bloom.counters) == counters
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Catalog service endpoints, run against an in-memory MongoDB (mongomock)
+"""
+
+import os
+import sys
+import json
+import importlib.util
+
+import mongomock
+import pymongo
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog-service")
+
+os.environ.update({
+    "MONGO_URI": "mongodb://localhost:27017/ualflix?replicaSet=rs",
+    "REDIS_HOST": "127.0.0.1",
+    "CHANGE_STREAM_ENABLED": "false",
+    "CACHE_WARMUP_ENABLED": "false",
+    "CHANGE_STREAM_CONSUMER": "catalog-1"
+})
+_client = mongomock.MongoClient("mongodb://localhost/ualflix")
+pymongo.MongoClient = lambda *args, **kwargs: _client
+sys.path.insert(0, SERVICE_DIR)
+spec = importlib.util.spec_from_file_location("catalog_app", os.path.join(SERVICE_DIR, "app.py"))
+catalog_app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(catalog_app)
+
+client = catalog_app.app.test_client()
+
+def test_resume_token_key_is_per_consumer():
+    assert catalog_app.RESUME_TOKEN_KEY.endswith(":catalog-1")
+
+class Redis:
+    """Enough of a Redis client for the resume token functions"""
+
+    def __init__(self):
+        self.values = {}
+        self.expiry = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.expiry[key] = ex
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+def test_resume_token_is_saved_under_the_consumer_key(monkeypatch):
+    redis = Redis()
+    monkeypatch.setattr(catalog_app, "redis_client", redis)
+    monkeypatch.setattr(catalog_app, "REDIS_AVAILABLE", True)
+    catalog_app._save_resume_token({"_data": "8263"})
+    assert json.loads(redis.values["catalog:videos:resume_token:catalog-1"]) == {"_data": "8263"}
+    assert redis.expiry["catalog:videos:resume_token:catalog-1"] == catalog_app.RESUME_TOKEN_TTL
+    assert catalog_app._load_resume_token() == {"_data": "8263"}
+    catalog_app._save_resume_token(None)
+    assert catalog_app._load_resume_token() is None
+
+def test_deleted_ids_stay_in_the_bloom_filter_until_a_rebuild(monkeypatch):
+    bloom = catalog_app.CountingBloomFilter(capacity=100)
+    for i in range(10):
+        bloom.add(f"{i:024x}")
+    counters = bytes(bloom.counters)
+    monkeypatch.setattr(catalog_app, "video_id_filter", bloom)
+    monkeypatch.setattr(catalog_app, "video_id_filter_deletes", 0)
+    catalog_app.video_id_filter_stale.clear()
+
+    # Deleting an ID the filter never saw must not touch the counters of the others
+    catalog_app.apply_video_change("delete", "f" * 24)
+    assert bytes(bloom.counters) == counters
+    assert catalog_app.video_id_filter_deletes == 1
+    assert not catalog_app.video_id_filter_stale.is_set()
+
+    monkeypatch.setattr(catalog_app, "video_id_filter_deletes", 99)
+    catalog_app.apply_video_change("delete", "0" * 24)
+    assert catalog_app.video_id_filter_stale.is_set()
+    catalog_app.video_id_filter_stale.clear()
+
+def create_video(**fields):
+    video = dict({"title": "t", "description": "d", "duration": 60, "genre": "Drama", "video_url": "/stream/a.mp4"},
+                 **fields)
+    response = client.post("/videos", json=video, headers={"Idempotency-Key": os.urandom(8).hex()})
+    assert response.status_code == 201
+    return response.json["video_id"]
+
+def test_update_changes_only_client_fields():
+    video_id = create_video()
+    response = client.put(f"/videos/{video_id}", json={"title": "New", "_id": video_id, "views": 1000})
+    assert response.status_code == 200
+    assert response.json["video"]["title"] == "New"
+    assert response.json["video"]["views"] == 0
+    assert "idempotency_key" not in response.json["video"]
+
+def test_update_rejects_internal_and_unknown_fields():
+    video_id = create_video()
+    stored = catalog_app.videos_collection.find_one({"_id": catalog_app.ObjectId(video_id)})
+    for body in ({"idempotency_key": "other"}, {"title": "x", "catalog_internal": 1}):
+        response = client.put(f"/videos/{video_id}", json=body)
+        assert response.status_code == 400
+    assert catalog_app.videos_collection.find_one({"_id": catalog_app.ObjectId(video_id)}) == stored
+
+def test_update_needs_a_field_to_change():
+    video_id = create_video()
+    assert client.put(f"/videos/{video_id}", json={"views": 5}).status_code == 400
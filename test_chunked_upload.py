@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Upload service: resumable upload chunk helpers (chunked_upload.py)
+"""
+
+import io
+import os
+import sys
+import hashlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload-service"))
+from chunked_upload import partial_path, chunk_count, chunk_length, preallocate, write_chunk, file_sha256
+
+def test_chunk_arithmetic():
+    assert chunk_count(0, 10) == 1
+    assert chunk_count(25, 10) == 3
+    assert [chunk_length(i, 25, 10) for i in range(4)] == [10, 10, 5, 0]
+
+def test_partial_path_is_hidden_next_to_the_target():
+    assert partial_path("/videos/ab/cd/x.mp4") == "/videos/ab/cd/.x.mp4.part"
+
+def test_chunks_written_out_of_order_assemble_the_file(tmp_path):
+    data = os.urandom(25000)
+    path = str(tmp_path / "x.mp4.part")
+    preallocate(path, len(data))
+    assert os.path.getsize(path) == len(data)
+    for index in (2, 0, 1):
+        chunk = data[index * 10000:(index + 1) * 10000]
+        written, digest = write_chunk(path, index * 10000, io.BytesIO(chunk), chunk_length(index, len(data), 10000))
+        assert written == len(chunk)
+        assert digest == hashlib.sha256(chunk).hexdigest()
+    assert file_sha256(path) == hashlib.sha256(data).hexdigest()
+
+def test_short_body_reports_what_was_written(tmp_path):
+    path = str(tmp_path / "x.mp4.part")
+    preallocate(path, 100)
+    written, _ = write_chunk(path, 0, io.BytesIO(b"abc"), 100)
+    assert written == 3
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Upload service: content deduplication index (dedup.py)
+"""
+
+import os
+import sys
+
+import mongomock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload-service"))
+from dedup import ContentIndex
+from storage_layout import sharded_path, flat_path
+
+def make_index(tmp_path):
+    return ContentIndex(mongomock.MongoClient().db.video_contents, str(tmp_path))
+
+def store(tmp_path, name, layout=sharded_path):
+    path = layout(str(tmp_path), name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"video")
+    return path
+
+def test_identical_content_shares_one_file_until_the_last_release(tmp_path):
+    index = make_index(tmp_path)
+    path = store(tmp_path, "a.mp4")
+    assert index.claim("digest", 5) is None
+    assert index.register("digest", 5, "a.mp4", path, "/stream/a.mp4") is None
+    shared = index.claim("digest", 5)
+    assert shared["stored_filename"] == "a.mp4" and shared["filepath_in_volume"] == path
+    assert index.release("digest") is False
+    assert index.release("digest") is True
+
+def test_claim_resolves_the_file_in_either_layout(tmp_path):
+    index = make_index(tmp_path)
+    path = store(tmp_path, "a.mp4", flat_path)
+    index.register("digest", 5, "a.mp4", sharded_path(str(tmp_path), "a.mp4"), "/stream/a.mp4")
+    assert index.claim("digest", 5)["filepath_in_volume"] == path
+
+def test_missing_stored_file_is_replaced(tmp_path):
+    index = make_index(tmp_path)
+    index.register("digest", 5, "gone.mp4", sharded_path(str(tmp_path), "gone.mp4"), "/stream/gone.mp4")
+    assert index.claim("digest", 5) is None
+    assert index.collection.count_documents({}) == 0
+
+def test_concurrent_register_returns_the_winner(tmp_path):
+    index = make_index(tmp_path)
+    path = store(tmp_path, "a.mp4")
+    index.register("digest", 5, "a.mp4", path, "/stream/a.mp4")
+    winner = index.register("digest", 5, "b.mp4", sharded_path(str(tmp_path), "b.mp4"), "/stream/b.mp4")
+    assert winner["stored_filename"] == "a.mp4"
+
+def test_unknown_content_keeps_its_file(tmp_path):
+    assert make_index(tmp_path).release("unknown") is False
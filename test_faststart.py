@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Upload service: moving moov in front of the media data (faststart.py)
+"""
+
+import os
+import sys
+import struct
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload-service"))
+from faststart import rewrite, top_level_boxes, FaststartError
+from media_probe import probe
+from test_media_probe import build_mp4, write, box
+
+MEDIA = bytes(range(256)) * 16
+
+def chunk_offsets(data):
+    """stco entries of the first track, from a file's bytes"""
+    start = data.index(b"stco") + 4
+    count = struct.unpack_from(">I", data, start + 4)[0]
+    return list(struct.unpack_from(f">{count}I", data, start + 8))
+
+def media_start(data):
+    """Offset of the first byte inside mdat"""
+    return data.index(b"mdat") + 4
+
+def test_rewrite_moves_moov_first_and_shifts_chunk_offsets(tmp_path):
+    # Chunk offsets point into mdat, whose payload starts after the 20 byte ftyp and its own header
+    original = build_mp4(media=MEDIA, chunk_offsets=[28, 28 + 1024])
+    path = write(tmp_path, original)
+    assert rewrite(path) is True
+
+    with open(path, "rb") as f:
+        data = f.read()
+        assert [b[0] for b in top_level_boxes(f, len(data))] == [b"ftyp", b"moov", b"mdat"]
+    assert probe(path)["faststart"] is True
+    offsets = chunk_offsets(data)
+    assert offsets == [media_start(data), media_start(data) + 1024]
+    assert data[offsets[0]:offsets[0] + 16] == MEDIA[:16]
+    assert data[offsets[1]:offsets[1] + 16] == MEDIA[1024:1040]
+    assert len(data) == len(original)
+
+def test_rewrite_leaves_faststart_files_alone(tmp_path):
+    data = build_mp4(moov_first=True, media=MEDIA, chunk_offsets=[0])
+    path = write(tmp_path, data)
+    assert rewrite(path) is False
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+def test_rewrite_rejects_files_without_mdat(tmp_path):
+    path = write(tmp_path, box(b"ftyp", b"isom\0\0\0\0isom") + box(b"free", b"\0" * 16))
+    with pytest.raises(FaststartError):
+        rewrite(path)
+    assert os.listdir(tmp_path) == ["movie.mp4"]
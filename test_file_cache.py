@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Streaming service: descriptor and stat cache (file_cache.py)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "streaming-service"))
+from file_cache import FileHandleCache, guess_mimetype
+from storage_layout import sharded_path, flat_path
+
+def write(path, data=b"0123456789"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def test_descriptors_are_reused_after_release(tmp_path):
+    write(flat_path(str(tmp_path), "a.mp4"))
+    cache = FileHandleCache(str(tmp_path))
+    f = cache.acquire("a.mp4")
+    fd = f.fileno()
+    assert f.read() == b"0123456789"
+    f.close()
+    g = cache.acquire("a.mp4")
+    assert g.fileno() == fd
+    g.close()
+    assert cache.stats()["open_fds"] == 1
+
+def test_missing_file_returns_none(tmp_path):
+    assert FileHandleCache(str(tmp_path)).acquire("missing.mp4") is None
+
+def test_hashed_layout_is_found_and_preferred(tmp_path):
+    base = str(tmp_path)
+    write(sharded_path(base, "a.mp4"), b"sharded")
+    write(flat_path(base, "a.mp4"), b"flat")
+    f = FileHandleCache(base).acquire("a.mp4")
+    assert f.read() == b"sharded"
+    f.close()
+
+def test_changed_file_is_reopened(tmp_path):
+    path = flat_path(str(tmp_path), "a.mp4")
+    write(path, b"old")
+    cache = FileHandleCache(str(tmp_path), check_interval=0)
+    f = cache.acquire("a.mp4")
+    f.close()
+    os.remove(path)
+    write(path, b"new content")
+    f = cache.acquire("a.mp4")
+    assert f.entry.size == len(b"new content")
+    assert f.read() == b"new content"
+    f.close()
+
+def test_descriptors_over_budget_are_closed(tmp_path):
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        write(flat_path(str(tmp_path), name))
+    cache = FileHandleCache(str(tmp_path), max_fds=2)
+    files = [cache.acquire(name) for name in ("a.mp4", "b.mp4", "c.mp4")]
+    for f in files:
+        f.close()
+    assert cache.stats()["open_fds"] <= 2
+
+def test_mimetypes():
+    assert guess_mimetype("a.MP4") == "video/mp4"
+    assert guess_mimetype("a.mkv") == "video/x-matroska"
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Upload service: MP4/MOV header probing (media_probe.py)
+"""
+
+import os
+import sys
+import struct
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload-service"))
+from media_probe import probe, ProbeError
+
+def box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+def full_box(box_type, payload, version=0):
+    return box(box_type, bytes([version, 0, 0, 0]) + payload)
+
+def track(handler, codec, width=0, height=0, chunk_offsets=None):
+    tkhd = full_box(b"tkhd", struct.pack(">IIIII", 0, 0, 1, 0, 0) + b"\0" * 52 +
+                    struct.pack(">II", width << 16, height << 16))
+    hdlr = full_box(b"hdlr", struct.pack(">I4s", 0, handler) + b"\0" * 12 + b"name\0")
+    stbl = full_box(b"stsd", struct.pack(">I", 1) + box(codec, b"\0" * 70))
+    if chunk_offsets is not None:
+        stbl += full_box(b"stco", struct.pack(f">I{len(chunk_offsets)}I", len(chunk_offsets), *chunk_offsets))
+    mdia = full_box(b"mdhd", b"\0" * 20) + hdlr + box(b"minf", box(b"stbl", stbl))
+    return box(b"trak", tkhd + box(b"mdia", mdia))
+
+def build_mp4(moov_first=False, brand=b"isom", seconds=10, media=b"\x01" * 4096, chunk_offsets=None):
+    """A minimal MP4: ftyp, then moov and mdat in the requested order"""
+    ftyp = box(b"ftyp", brand + b"\0\0\0\0" + brand)
+    mvhd = full_box(b"mvhd", struct.pack(">IIII", 0, 0, 1000, seconds * 1000) + b"\0" * 80)
+    moov = box(b"moov", mvhd + track(b"vide", b"avc1", 1280, 720, chunk_offsets) + track(b"soun", b"mp4a"))
+    mdat = box(b"mdat", media)
+    return ftyp + (moov + mdat if moov_first else mdat + moov)
+
+def write(tmp_path, data, name="movie.mp4"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+def test_probe_reads_duration_resolution_and_codecs(tmp_path):
+    info = probe(write(tmp_path, build_mp4(moov_first=True)))
+    assert info["duration"] == 10
+    assert (info["width"], info["height"]) == (1280, 720)
+    assert (info["video_codec"], info["audio_codec"]) == ("avc1", "mp4a")
+    assert info["container"] == "mp4" and info["faststart"] is True
+    assert info["bitrate"] == int(os.path.getsize(tmp_path / "movie.mp4") * 8 / 10)
+
+def test_probe_reports_moov_after_mdat(tmp_path):
+    info = probe(write(tmp_path, build_mp4(brand=b"qt  ")))
+    assert info["faststart"] is False
+    assert info["container"] == "mov"
+
+def test_probe_rejects_other_files(tmp_path):
+    with pytest.raises(ProbeError):
+        probe(write(tmp_path, b"RIFF" + b"\0" * 100, "movie.avi"))
+
+def test_probe_rejects_a_file_without_moov(tmp_path):
+    with pytest.raises(ProbeError):
+        probe(write(tmp_path, box(b"ftyp", b"isom\0\0\0\0isom") + box(b"mdat", b"\0" * 64)))
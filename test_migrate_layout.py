@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Upload service: flat to hashed layout migration (migrate_layout.py)
+"""
+
+import os
+import sys
+
+import mongomock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload-service"))
+from migrate_layout import migrate, fix_metadata
+from storage_layout import sharded_path, flat_path
+
+def write_flat(base_dir, name, data=b"video"):
+    with open(flat_path(base_dir, name), "wb") as f:
+        f.write(data)
+
+def test_migrate_moves_files_and_updates_every_record(tmp_path):
+    base = str(tmp_path)
+    collection = mongomock.MongoClient().db.uploads_metadata
+    for name in ("a.mp4", "b.mp4"):
+        write_flat(base, name)
+    # Two deduplicated uploads share a.mp4
+    collection.insert_many([
+        {"stored_filename": "a.mp4", "filepath_in_volume": flat_path(base, "a.mp4")},
+        {"stored_filename": "a.mp4", "filepath_in_volume": flat_path(base, "a.mp4")},
+        {"stored_filename": "b.mp4", "filepath_in_volume": flat_path(base, "b.mp4")}
+    ])
+
+    result = migrate(base, [collection], batch_size=1, pause=0, limit=0, dry_run=False)
+
+    assert result == {"moved": 2, "failed": 0, "metadata_fixed": 0}
+    for name in ("a.mp4", "b.mp4"):
+        assert os.path.exists(sharded_path(base, name))
+        assert not os.path.exists(flat_path(base, name))
+    for doc in collection.find():
+        assert doc["filepath_in_volume"] == sharded_path(base, doc["stored_filename"])
+
+def test_fix_metadata_repairs_all_records_of_a_moved_file(tmp_path):
+    base = str(tmp_path)
+    collection = mongomock.MongoClient().db.uploads_metadata
+    target = sharded_path(base, "a.mp4")
+    os.makedirs(os.path.dirname(target))
+    with open(target, "wb") as f:
+        f.write(b"video")
+    collection.insert_many([
+        {"stored_filename": "a.mp4", "filepath_in_volume": flat_path(base, "a.mp4")},
+        {"stored_filename": "a.mp4", "filepath_in_volume": flat_path(base, "a.mp4")},
+        {"stored_filename": "gone.mp4", "filepath_in_volume": flat_path(base, "gone.mp4")}
+    ])
+
+    assert fix_metadata(collection, base) == 2
+    assert collection.count_documents({"filepath_in_volume": target}) == 2
+    assert collection.count_documents({"stored_filename": "gone.mp4",
+                                        "filepath_in_volume": flat_path(base, "gone.mp4")}) == 1
+
+def test_rerun_after_interrupted_copy_keeps_one_file(tmp_path):
+    base = str(tmp_path)
+    write_flat(base, "a.mp4")
+    target = sharded_path(base, "a.mp4")
+    os.makedirs(os.path.dirname(target))
+    with open(target, "wb") as f:
+        f.write(b"video")
+
+    result = migrate(base, [], batch_size=10, pause=0, limit=0, dry_run=False)
+
+    assert result["moved"] == 1
+    assert os.path.exists(target) and not os.path.exists(flat_path(base, "a.mp4"))
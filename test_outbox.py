@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Upload service: catalog notification outbox (outbox.py)
+"""
+
+import os
+import sys
+import json
+from datetime import datetime
+
+import mongomock
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload-service"))
+from outbox import CatalogOutbox
+
+class Catalog:
+    """Answers the outbox requests with canned responses, recording what was sent"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def _respond(self, method, url, body):
+        self.requests.append((method, url, body))
+        status, content = self.responses.pop(0) if self.responses else (200, {})
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(content).encode()
+        response.url = url
+        return response
+
+    def post(self, url, json=None, **kwargs):
+        return self._respond("POST", url, json)
+
+    def put(self, url, json=None, **kwargs):
+        return self._respond("PUT", url, json)
+
+def make_outbox(*responses):
+    collection = mongomock.MongoClient().db.uploads_metadata
+    outbox = CatalogOutbox(collection, "http://catalog/videos", "http://catalog/videos/batch")
+    outbox.http = Catalog(*responses)
+    return outbox, collection
+
+def add_upload(outbox, title):
+    return outbox.collection.insert_one({"title": title, outbox.FIELD: outbox.entry({"title": title})}).inserted_id
+
+def state(collection, upload_id):
+    return collection.find_one({"_id": upload_id})[CatalogOutbox.FIELD]
+
+def test_batch_delivery_marks_entries_delivered():
+    outbox, collection = make_outbox((200, {"results": [{"status": "created", "video_id": "v1"},
+                                                        {"status": "exists", "video_id": "v2"}]}))
+    first, second = add_upload(outbox, "a"), add_upload(outbox, "b")
+    assert outbox.dispatch_once() == 2
+    method, url, body = outbox.http.requests[0]
+    assert url.endswith("/batch") and [v["title"] for v in body["videos"]] == ["a", "b"]
+    assert all(v["idempotency_key"] for v in body["videos"])
+    assert state(collection, first)["state"] == "delivered"
+    assert collection.find_one({"_id": second})["catalog_video_id"] == "v2"
+    assert outbox.dispatch_once() == 0
+
+def test_server_errors_are_retried_later_with_backoff():
+    outbox, collection = make_outbox((503, {}))
+    upload_id = add_upload(outbox, "a")
+    assert outbox.dispatch_once() == 1
+    entry = state(collection, upload_id)
+    assert entry["state"] == "pending" and entry["attempts"] == 1
+    assert entry["next_attempt_at"] > datetime.utcnow()
+    assert outbox.dispatch_once() == 0
+
+def test_rejected_entries_fail_without_retry():
+    outbox, collection = make_outbox((200, {"results": [{"status": "error", "error": "bad title"}]}))
+    upload_id = add_upload(outbox, "a")
+    outbox.dispatch_once()
+    assert state(collection, upload_id)["state"] == "failed"
+
+def test_falls_back_to_one_request_per_entry_without_the_batch_endpoint():
+    outbox, collection = make_outbox((404, {}), (201, {"video_id": "v1"}))
+    upload_id = add_upload(outbox, "a")
+    outbox.dispatch_once()
+    assert [r[1] for r in outbox.http.requests] == ["http://catalog/videos/batch", "http://catalog/videos"]
+    assert state(collection, upload_id)["state"] == "delivered"
+
+def test_attach_rides_along_before_delivery_and_updates_after():
+    outbox, collection = make_outbox((200, {"results": [{"status": "created", "video_id": "v1"}]}))
+    upload_id = add_upload(outbox, "a")
+    outbox.attach(upload_id, {"duration": 12.5})
+    outbox.dispatch_once()
+    assert outbox.http.requests[0][2]["videos"][0]["duration"] == 12.5
+
+    outbox.attach(upload_id, {"duration": 13})
+    method, url, body = outbox.http.requests[-1]
+    assert (method, url, body) == ("PUT", "http://catalog/videos/v1", {"duration": 13})
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Streaming service: Range and conditional request handling (ranges.py)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "streaming-service"))
+from ranges import parse_range_header, coalesce, check_preconditions, plan_response, MAX_RANGES
+
+ETAG = '"1000-abc"'
+MTIME = 1700000000.0
+
+class Entry:
+    size = 1000
+    etag = ETAG
+    mtime = MTIME
+    mimetype = "video/mp4"
+
+def headers(**values):
+    values = {k.replace("_", "-"): v for k, v in values.items()}
+    return values.get
+
+def test_parse_single_open_and_suffix_ranges():
+    assert parse_range_header("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range_header("bytes=900-", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=500-5000", 1000) == [(500, 999)]
+
+def test_parse_ignores_invalid_and_reports_unsatisfiable():
+    assert parse_range_header("items=0-1", 1000) is None
+    assert parse_range_header("bytes=5-1", 1000) is None
+    assert parse_range_header("bytes=a-b", 1000) is None
+    assert parse_range_header("bytes=1000-", 1000) == []
+
+def test_coalesce_merges_overlapping_and_close_ranges():
+    assert coalesce([(500, 599), (0, 99), (50, 150)]) == [(0, 150), (500, 599)]
+    assert coalesce([(0, 99), (110, 199)], gap=16) == [(0, 199)]
+    assert coalesce([(0, 99), (300, 399)], gap=16) == [(0, 99), (300, 399)]
+
+def test_preconditions():
+    assert check_preconditions("GET", headers(If_None_Match=ETAG), ETAG, MTIME) == 304
+    assert check_preconditions("GET", headers(If_Match='"other"'), ETAG, MTIME) == 412
+    assert check_preconditions("GET", headers(If_Match=ETAG), ETAG, MTIME) is None
+    assert check_preconditions("GET", headers(If_None_Match='W/' + ETAG), ETAG, MTIME) == 304
+
+def test_plan_full_single_and_unsatisfiable():
+    plan = plan_response("GET", headers(), Entry())
+    assert plan["status"] == 200 and plan["segments"] == [(b"", 0, 1000)]
+
+    plan = plan_response("GET", headers(Range="bytes=100-199"), Entry())
+    assert plan["status"] == 206 and plan["segments"] == [(b"", 100, 100)]
+    assert ("Content-Range", "bytes 100-199/1000") in plan["headers"]
+
+    plan = plan_response("GET", headers(Range="bytes=2000-"), Entry())
+    assert plan["status"] == 416 and ("Content-Range", "bytes */1000") in plan["headers"]
+
+def test_plan_if_range_mismatch_serves_the_whole_file():
+    plan = plan_response("GET", headers(Range="bytes=0-9", If_Range='"stale"'), Entry())
+    assert plan["status"] == 200
+
+def test_plan_multipart_content_length_matches_segments():
+    plan = plan_response("GET", headers(Range="bytes=0-9,500-509"), Entry())
+    assert plan["status"] == 206
+    assert [(start, length) for _, start, length in plan["segments"]] == [(0, 10), (500, 10), (0, 0)]
+    content_length = dict(plan["headers"])["Content-Length"]
+    assert int(content_length) == sum(len(prefix) + length for prefix, _, length in plan["segments"])
+
+def test_plan_too_many_ranges_serves_the_whole_file():
+    spec = ",".join(f"{i * 300}-{i * 300}" for i in range(MAX_RANGES + 1))
+    class Big(Entry):
+        size = 300 * (MAX_RANGES + 1)
+    assert plan_response("GET", headers(Range=f"bytes={spec}"), Big())["status"] == 200
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Streaming service: sequential-access detection and prefetch (readahead.py)
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "streaming-service"))
+from block_cache import BlockCache
+from file_cache import FileHandleCache
+from readahead import ReadaheadPrefetcher
+
+BLOCK = 64 * 1024
+MB = 1024 * 1024
+
+def setup(tmp_path, size=8 * MB, head_bytes=1 * MB):
+    with open(tmp_path / "movie.mp4", "wb") as f:
+        f.write(os.urandom(size))
+    files = FileHandleCache(str(tmp_path))
+    blocks = BlockCache(4 * MB, block_size=BLOCK, head_bytes=head_bytes)
+    prefetcher = ReadaheadPrefetcher(files, blocks, workers=1, min_window=1 * MB, max_window=4 * MB)
+    return files, blocks, prefetcher, files.lookup("movie.mp4")
+
+def wait_idle(prefetcher):
+    prefetcher.pool.shutdown(wait=True)
+
+def resident(blocks, entry):
+    return [i for i in range(entry.size // BLOCK) if blocks.contains(entry.key, i)]
+
+def test_random_access_does_not_prefetch(tmp_path):
+    _, blocks, prefetcher, entry = setup(tmp_path)
+    prefetcher.observe("client", entry, 5 * MB, 256 * 1024)
+    wait_idle(prefetcher)
+    assert prefetcher.prefetches == 0
+
+def test_sequential_reads_past_the_head_stay_out_of_the_block_cache(tmp_path):
+    _, blocks, prefetcher, entry = setup(tmp_path)
+    prefetcher.observe("client", entry, 2 * MB, 1 * MB)
+    prefetcher.observe("client", entry, 3 * MB, 1 * MB)
+    wait_idle(prefetcher)
+    assert prefetcher.prefetches == 1
+    assert resident(blocks, entry) == []
+
+def test_open_ended_range_fills_only_head_blocks(tmp_path):
+    _, blocks, prefetcher, entry = setup(tmp_path, head_bytes=MB + MB // 2)
+    # The response reads its first window itself, the prefetch covers [1 MB, 2 MB)
+    # of which only the part inside the head goes to the block cache
+    prefetcher.observe("client", entry, 0, entry.size)
+    wait_idle(prefetcher)
+    assert prefetcher.prefetches == 1
+    assert resident(blocks, entry) == list(range(MB // BLOCK, (MB + MB // 2) // BLOCK))
+
+def test_seek_resets_the_window(tmp_path):
+    _, _, prefetcher, entry = setup(tmp_path)
+    prefetcher.observe("client", entry, 2 * MB, 1 * MB)
+    prefetcher.observe("client", entry, 3 * MB, 1 * MB)
+    state = prefetcher.sessions[("client", entry.key)]
+    assert state.window == 2 * MB
+    time.sleep(0.01)
+    prefetcher.observe("client", entry, 7 * MB, 256 * 1024)
+    assert state.window == MB
+    wait_idle(prefetcher)
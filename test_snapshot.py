@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Catalog service: columnar in-memory catalog snapshot (snapshot.py)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog-service"))
+from snapshot import CatalogSnapshot
+
+def video(video_id, genre="Drama", views=0, **extra):
+    return dict({"_id": video_id, "title": f"Title {video_id}", "description": "d", "duration": 60,
+                 "genre": genre, "video_url": f"/stream/{video_id}.mp4", "views": views}, **extra)
+
+def test_upsert_and_get_round_trip_with_extra_fields():
+    snapshot = CatalogSnapshot()
+    snapshot.upsert(video("01", probe={"width": 1920}))
+    assert snapshot.get("01") == video("01", probe={"width": 1920})
+    assert snapshot.get("02") is None
+
+def test_list_is_in_id_order_and_filters_by_genre():
+    snapshot = CatalogSnapshot()
+    for video_id, genre in (("03", "Drama"), ("01", "Comedy"), ("02", "Drama")):
+        snapshot.upsert(video(video_id, genre))
+    assert [v["_id"] for v in snapshot.list()] == ["01", "02", "03"]
+    assert [v["_id"] for v in snapshot.list(genre="Drama")] == ["02", "03"]
+    assert snapshot.list(genre="Horror") == []
+    assert len(snapshot.list(limit=2)) == 2
+
+def test_remove_keeps_the_other_slots_intact():
+    snapshot = CatalogSnapshot()
+    for video_id in ("01", "02", "03"):
+        snapshot.upsert(video(video_id))
+    snapshot.remove("01")
+    assert snapshot.get("01") is None
+    assert snapshot.get("03") == video("03")
+    assert [v["_id"] for v in snapshot.list()] == ["02", "03"]
+
+def test_popular_orders_by_views():
+    snapshot = CatalogSnapshot()
+    for video_id, views in (("01", 5), ("02", 50), ("03", 10)):
+        snapshot.upsert(video(video_id, views=views))
+    assert [v["_id"] for v in snapshot.popular(limit=2)] == ["02", "03"]
+
+def test_bad_numeric_values_do_not_break_the_columns():
+    snapshot = CatalogSnapshot()
+    snapshot.upsert(dict(video("01"), duration="long", views=float("inf"), genre=None))
+    stored = snapshot.get("01")
+    assert stored["duration"] == 0 and stored["views"] == 0 and stored["genre"] == "General"
+
+def test_load_does_not_resurrect_videos_deleted_meanwhile():
+    snapshot = CatalogSnapshot()
+
+    def cursor():
+        yield video("01")
+        # Change events arriving during the load: 02 deleted, 03 updated
+        snapshot.remove("02")
+        snapshot.upsert(video("03", views=7))
+        yield video("02")
+        yield video("03", views=1)
+
+    snapshot.load(cursor())
+    assert snapshot.get("02") is None
+    assert snapshot.get("03")["views"] == 7
+    assert snapshot.stats() == {"ready": True, "videos": 2, "genres": 1}
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Streaming service: byte, abort and TTFB accounting on the sendfile path
+
+Drives /stream/<file> through the app as gunicorn does: the body comes back
+as a wsgi.file_wrapper, is sent with socket.sendfile and then closed.
+"""
+
+import os
+import sys
+import socket
+import tempfile
+import threading
+import importlib.util
+
+from gunicorn.http.wsgi import FileWrapper
+from prometheus_client import REGISTRY
+from werkzeug.test import EnvironBuilder
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streaming-service")
+VIDEO_DIR = tempfile.mkdtemp()
+FILE_SIZE = 8 * 1024 * 1024
+
+os.environ.update({
+    "UPLOADS_DIR": VIDEO_DIR,
+    "STREAM_BLOCK_CACHE_MB": "0",
+    "STREAM_READAHEAD": "false",
+    "STREAM_VIEW_ACCOUNTING": "false"
+})
+sys.path.insert(0, SERVICE_DIR)
+spec = importlib.util.spec_from_file_location("streaming_app", os.path.join(SERVICE_DIR, "app.py"))
+streaming_app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(streaming_app)
+
+with open(os.path.join(VIDEO_DIR, "movie.mp4"), "wb") as f:
+    f.write(os.urandom(FILE_SIZE))
+
+def sample(name):
+    return REGISTRY.get_sample_value(name) or 0.0
+
+def request_body(range_header=None):
+    headers = {"Range": range_header} if range_header else {}
+    environ = EnvironBuilder(path="/stream/movie.mp4", headers=headers).get_environ()
+    environ["wsgi.file_wrapper"] = FileWrapper
+    environ["SERVER_SOFTWARE"] = "gunicorn/23.0.0"
+    status = []
+    body = streaming_app.app(environ, lambda s, h, exc_info=None: status.append(s))
+    return status[0], body
+
+def gunicorn_sendfile(body, read_limit=None):
+    """What gunicorn's Response.sendfile does with a wrapped file; returns the bytes received"""
+    sender, receiver = socket.socketpair()
+    received = []
+
+    def drain():
+        total = 0
+        while read_limit is None or total < read_limit:
+            data = receiver.recv(65536)
+            if not data:
+                break
+            total += len(data)
+        received.append(total)
+        receiver.close()
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    fileno = body.filelike.fileno()
+    offset = os.lseek(fileno, 0, os.SEEK_CUR)
+    try:
+        sender.sendfile(body.filelike, offset=offset, count=body.filelike.length)
+        os.lseek(fileno, offset, os.SEEK_SET)
+    except OSError:
+        pass
+    finally:
+        sender.close()
+        reader.join()
+        body.close()
+    return received[0]
+
+def test_full_response_uses_file_wrapper_and_counts_all_bytes():
+    sent, aborts, ttfb = sample("stream_bytes_sent_total"), sample("stream_client_aborts_total"), \
+        sample("stream_time_to_first_byte_seconds_count")
+    status, body = request_body()
+    assert status.startswith("200")
+    assert isinstance(body, FileWrapper)
+    assert gunicorn_sendfile(body) == FILE_SIZE
+    assert sample("stream_bytes_sent_total") - sent == FILE_SIZE
+    assert sample("stream_client_aborts_total") == aborts
+    assert sample("stream_time_to_first_byte_seconds_count") == ttfb + 1
+    assert sample("stream_active_streams") == 0
+
+def test_open_ended_range_counts_the_range():
+    sent, aborts = sample("stream_bytes_sent_total"), sample("stream_client_aborts_total")
+    status, body = request_body("bytes=1000000-")
+    assert status.startswith("206")
+    assert gunicorn_sendfile(body) == FILE_SIZE - 1000000
+    assert sample("stream_bytes_sent_total") - sent == FILE_SIZE - 1000000
+    assert sample("stream_client_aborts_total") == aborts
+
+def test_client_disconnect_counts_partial_bytes_and_an_abort():
+    sent, aborts = sample("stream_bytes_sent_total"), sample("stream_client_aborts_total")
+    _, body = request_body("bytes=0-")
+    gunicorn_sendfile(body, read_limit=256 * 1024)
+    delta = sample("stream_bytes_sent_total") - sent
+    assert 0 < delta < FILE_SIZE
+    assert sample("stream_client_aborts_total") == aborts + 1
+
+def test_body_closed_without_sending_is_an_abort():
+    sent, aborts = sample("stream_bytes_sent_total"), sample("stream_client_aborts_total")
+    _, body = request_body("bytes=0-")
+    body.close()
+    assert sample("stream_bytes_sent_total") == sent
+    assert sample("stream_client_aborts_total") == aborts + 1
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Upload service endpoints, run against an in-memory MongoDB (mongomock)
+"""
+
+import io
+import os
+import sys
+import json
+import tempfile
+import importlib.util
+
+import mongomock
+import pymongo
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload-service")
+UPLOADS_DIR = tempfile.mkdtemp()
+
+os.environ.update({
+    "UPLOADS_DIR": UPLOADS_DIR,
+    "MEDIA_PROBE": "false"
+})
+_client = mongomock.MongoClient("mongodb://localhost/ualflix")
+pymongo.MongoClient = lambda *args, **kwargs: _client
+sys.path.insert(0, SERVICE_DIR)
+import outbox
+outbox.CatalogOutbox.start = lambda self: None
+spec = importlib.util.spec_from_file_location("upload_app", os.path.join(SERVICE_DIR, "app.py"))
+upload_app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(upload_app)
+
+client = upload_app.app.test_client()
+
+def stored_files():
+    return [name for _, _, names in os.walk(UPLOADS_DIR) for name in names]
+
+def post_batch(data):
+    return client.post("/batch", data=data, content_type="multipart/form-data")
+
+def test_batch_stores_each_file_with_its_metadata():
+    before = upload_app.uploads_metadata_collection.count_documents({})
+    response = post_batch({
+        "metadata": json.dumps([{"title": "Episode 1"}, {"genre": "Drama"}]),
+        "description": "Season 1",
+        "files": [(io.BytesIO(os.urandom(4096)), "ep1.mp4", "video/mp4"),
+                  (io.BytesIO(os.urandom(4096)), "ep2.mp4", "video/mp4")]
+    })
+    assert response.status_code == 201
+    assert response.json["created"] == 2
+    titles = [r["title"] for r in response.json["results"]]
+    assert titles == ["Episode 1", "ep2"]
+    assert upload_app.uploads_metadata_collection.count_documents({}) == before + 2
+
+def test_batch_rejects_metadata_that_is_not_a_list_before_storing_files():
+    files_before = len(stored_files())
+    response = post_batch({
+        "metadata": json.dumps({"x": 1}),
+        "description": "d",
+        "files": [(io.BytesIO(os.urandom(4096)), "a.mp4", "video/mp4")]
+    })
+    assert response.status_code == 400
+    assert len(stored_files()) == files_before
+
+def test_batch_releases_published_files_when_metadata_comes_after_them():
+    files_before = len(stored_files())
+    contents_before = upload_app.db["video_contents"].count_documents({})
+    response = post_batch({
+        "description": "d",
+        "files": [(io.BytesIO(os.urandom(4096)), "a.mp4", "video/mp4"),
+                  (io.BytesIO(os.urandom(4096)), "b.mp4", "video/mp4")],
+        "metadata": json.dumps([{"title": 5}])
+    })
+    assert response.status_code == 400
+    assert len(stored_files()) == files_before
+    assert upload_app.db["video_contents"].count_documents({}) == contents_before
+
+def test_batch_rejects_metadata_entries_that_are_not_objects():
+    response = post_batch({
+        "metadata": json.dumps(["title"]),
+        "description": "d",
+        "files": [(io.BytesIO(os.urandom(4096)), "a.mp4", "video/mp4")]
+    })
+    assert response.status_code == 400
+
+def create_session(client_ip, size=1024 * 1024):
+    return client.post("/sessions", json={"filename": "a.mp4", "title": "t", "description": "d", "size": size},
+                       headers={"X-Real-IP": client_ip})
+
+def quota(client_ip):
+    return upload_app.upload_clients_collection.find_one({"_id": client_ip}) or {"sessions": 0, "bytes": 0}
+
+def test_session_limit_per_client(monkeypatch):
+    monkeypatch.setattr(upload_app.chunked_upload, "MAX_SESSIONS_PER_CLIENT", 2)
+    first = create_session("10.0.0.1")
+    assert first.status_code == 201
+    assert create_session("10.0.0.1").status_code == 201
+    assert create_session("10.0.0.1").status_code == 429
+    assert create_session("10.0.0.2").status_code == 201
+    assert quota("10.0.0.1")["sessions"] == 2
+
+    assert client.delete(f"/sessions/{first.json['session_id']}").status_code == 200
+    assert quota("10.0.0.1")["sessions"] == 1
+    assert create_session("10.0.0.1").status_code == 201
+
+def test_session_bytes_limit_per_client(monkeypatch):
+    monkeypatch.setattr(upload_app.chunked_upload, "MAX_SESSION_BYTES_PER_CLIENT", 3 * 1024 * 1024)
+    assert create_session("10.0.0.3", size=2 * 1024 * 1024).status_code == 201
+    response = create_session("10.0.0.3", size=2 * 1024 * 1024)
+    assert response.status_code == 429 and "size limit" in response.json["error"]
+    assert quota("10.0.0.3")["bytes"] == 2 * 1024 * 1024
+
+def test_completed_and_reaped_sessions_release_their_quota():
+    data = os.urandom(300 * 1024)
+    session = create_session("10.0.0.4", size=len(data)).json
+    response = client.put(f"/sessions/{session['session_id']}/chunks/0", data=data)
+    assert response.status_code == 200
+    assert client.post(f"/sessions/{session['session_id']}/complete").status_code == 201
+    assert quota("10.0.0.4")["sessions"] == 0
+
+    session = create_session("10.0.0.4").json
+    expired = upload_app.datetime.utcnow() - upload_app.timedelta(minutes=1)
+    upload_app.uploads_metadata_collection.update_one(
+        {"_id": upload_app.ObjectId(session["session_id"])}, {"$set": {"expires_at": expired}})
+    upload_app.reap_expired_sessions()
+    assert (quota("10.0.0.4")["sessions"], quota("10.0.0.4")["bytes"]) == (0, 0)
+
+def test_idle_counters_without_open_sessions_are_dropped():
+    upload_app.upload_clients_collection.insert_one(
+        {"_id": "10.0.0.5", "sessions": 3, "bytes": 10, "updated_at": upload_app.datetime(2000, 1, 1)})
+    upload_app.drop_idle_client_quotas()
+    assert upload_app.upload_clients_collection.find_one({"_id": "10.0.0.5"}) is None
+
+def test_uploads_without_limit_or_cursor_are_one_array():
+    response = client.get("/uploads")
+    assert response.status_code == 200
+    assert isinstance(response.json, list)
+    assert response.json and all("filepath_in_volume" not in u for u in response.json)
+
+def test_uploads_pages_follow_the_cursor():
+    total = len(client.get("/uploads").json)
+    seen = []
+    page = client.get("/uploads?limit=2").json
+    while True:
+        assert page["count"] == len(page["uploads"]) <= 2
+        seen += [u["_id"] for u in page["uploads"]]
+        if not page["next_cursor"]:
+            break
+        page = client.get(f"/uploads?limit=2&cursor={page['next_cursor']}").json
+    assert len(seen) == len(set(seen)) == total
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Streaming service: views counted from playback sessions (view_accounting.py)
+"""
+
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "streaming-service"))
+from view_accounting import ViewAccounting
+
+MB = 1024 * 1024
+
+class Entry:
+    size = 100 * MB
+
+class Catalog:
+    """Records the batches posted to the catalog and answers with status"""
+
+    def __init__(self, status=200):
+        self.status = status
+        self.batches = []
+
+    def post(self, url, json=None, timeout=None):
+        self.batches.append(json["increments"])
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = b'{"unmatched": []}'
+        return response
+
+def accounting(status=200, **kwargs):
+    views = ViewAccounting("http://catalog/views/batch", min_bytes=2 * MB, **kwargs)
+    views.http = Catalog(status)
+    return views
+
+def test_a_session_counts_once_it_reaches_min_bytes():
+    views = accounting()
+    views.record("client", Entry(), "v1", 0, MB)
+    assert views.views_counted == 0
+    views.record("client", Entry(), "v1", MB, MB)
+    views.record("client", Entry(), "v1", 2 * MB, 10 * MB)
+    assert views.views_counted == 1
+    views.flush()
+    assert views.http.batches == [[{"video_id": "v1", "count": 1}]]
+    assert views.stats()["views_sent"] == 1
+
+def test_views_are_per_client_and_per_video():
+    views = accounting()
+    for client, video in (("a", "v1"), ("b", "v1"), ("a", "v2")):
+        views.record(client, Entry(), video, 0, 3 * MB)
+    views.flush()
+    assert sorted((i["video_id"], i["count"]) for i in views.http.batches[0]) == [("v1", 2), ("v2", 1)]
+
+def test_replay_from_the_start_after_the_end_is_a_new_view():
+    views = accounting()
+    views.record("client", Entry(), "v1", 0, Entry.size)
+    views.record("client", Entry(), "v1", 0, 3 * MB)
+    assert views.views_counted == 2
+
+def test_seeking_back_is_the_same_view():
+    views = accounting()
+    views.record("client", Entry(), "v1", 0, 3 * MB)
+    views.record("client", Entry(), "v1", 0, 3 * MB)
+    assert views.views_counted == 1
+
+def test_server_errors_are_retried_then_dropped():
+    views = accounting(status=503, max_retries=2)
+    views.record("client", Entry(), "v1", 0, 3 * MB)
+    for _ in range(3):
+        views.flush()
+    assert len(views.http.batches) == 3
+    assert views.stats()["pending_videos"] == 0
+    assert views.views_dropped == 1
+
+def test_rejected_counts_are_dropped_straight_away():
+    views = accounting(status=400)
+    views.record("client", Entry(), "v1", 0, 3 * MB)
+    views.flush()
+    views.flush()
+    assert len(views.http.batches) == 1
+    assert views.views_dropped == 1
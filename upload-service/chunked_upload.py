@@ -0,0 +1,87 @@
+import os
+import errno
+import hashlib
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_MB", "8")) * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_GB", "20")) * 1024 ** 3
+# Unfinished sessions are removed this long after their last chunk
+SESSION_TTL_SECONDS = int(os.environ.get("UPLOAD_SESSION_TTL_HOURS", "24")) * 3600
+# Open sessions one client may hold, and the bytes they may announce in total
+MAX_SESSIONS_PER_CLIENT = int(os.environ.get("UPLOAD_SESSIONS_PER_CLIENT", "4"))
+MAX_SESSION_BYTES_PER_CLIENT = int(os.environ.get("UPLOAD_SESSION_BYTES_PER_CLIENT_GB", "40")) * 1024 ** 3
+IO_SIZE = 1024 * 1024
+
+def partial_path(final_path: str) -> str:
+    """Hidden name the file is assembled under until the session is finalized"""
+    directory, name = os.path.split(final_path)
+    return os.path.join(directory, f".{name}.part")
+
+def chunk_count(size: int, chunk_size: int) -> int:
+    return max(1, (size + chunk_size - 1) // chunk_size)
+
+def chunk_length(index: int, size: int, chunk_size: int) -> int:
+    """Expected length of one chunk (the last one may be shorter)"""
+    return max(0, min(chunk_size, size - index * chunk_size))
+
+def preallocate(path: str, size: int):
+    """Create the target file with its final size so chunks can be written in any order
+
+    The file starts sparse; disk blocks are reserved one chunk at a time
+    as chunks arrive, so an abandoned session holds no more space than
+    what was actually sent.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+def write_chunk(path: str, offset: int, stream, length: int):
+    """Copy one chunk from the request body to its offset with positioned writes
+
+    Returns (bytes written, sha256 hex of the chunk). Other chunks of the
+    same file may be written concurrently through their own descriptors.
+    """
+    digest = hashlib.sha256()
+    written = 0
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        if length and hasattr(os, "posix_fallocate"):
+            try:
+                # Reserve this chunk's blocks: ENOSPC before its data is read
+                os.posix_fallocate(fd, offset, length)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise
+        while written < length:
+            data = stream.read(min(IO_SIZE, length - written))
+            if not data:
+                break
+            view = memoryview(data)
+            while view:
+                n = os.pwrite(fd, view, offset + written)
+                view = view[n:]
+                written += n
+            digest.update(data)
+    finally:
+        os.close(fd)
+    return written, digest.hexdigest()
+
+def file_sha256(path: str) -> str:
+    """Checksum of the assembled file"""
+    digest = hashlib.sha256()
+    with open(path, "rb", buffering=0) as f:
+        buffer = bytearray(IO_SIZE)
+        view = memoryview(buffer)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
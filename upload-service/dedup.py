@@ -0,0 +1,85 @@
+import os
+import logging
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from storage_layout import candidate_paths
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ContentIndex:
+    """Digest -> stored file index with reference counts (collection "video_contents")
+
+    Uploads with the same SHA-256 share one stored file: later uploads point
+    their metadata at the file of the first one. A file is deleted only when
+    the last upload referencing it is removed.
+
+    The stored path is resolved from stored_filename when the entry is used,
+    so entries stay valid while files move between storage layouts.
+    """
+
+    def __init__(self, collection, base_dir: str):
+        self.collection = collection
+        self.base_dir = base_dir
+
+    def locate(self, doc):
+        """Current path of an entry's stored file, or None if it is gone"""
+        for path in candidate_paths(self.base_dir, doc["stored_filename"]):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def claim(self, digest: str, size: int):
+        """Take a reference on existing content, or None if this content is new"""
+        doc = self.collection.find_one_and_update(
+            {"_id": digest, "size_bytes": size, "refcount": {"$gt": 0}},
+            {"$inc": {"refcount": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            return None
+        path = self.locate(doc)
+        if path is None:
+            # The stored copy is gone: drop the stale entry and store this upload as new content
+            logger.warning(f"Stored file for content {digest} is missing, replacing it")
+            self.collection.delete_one({"_id": digest, "stored_filename": doc["stored_filename"]})
+            return None
+        doc["filepath_in_volume"] = path
+        return doc
+
+    def register(self, digest: str, size: int, stored_filename: str, path: str, video_access_url: str):
+        """Record newly stored content; returns None, or the entry of a concurrent upload that won"""
+        for _ in range(2):
+            try:
+                self.collection.insert_one({
+                    "_id": digest,
+                    "size_bytes": size,
+                    "stored_filename": stored_filename,
+                    "filepath_in_volume": path,
+                    "video_access_url": video_access_url,
+                    "refcount": 1
+                })
+                return None
+            except DuplicateKeyError:
+                doc = self.claim(digest, size)
+                if doc is not None:
+                    return doc
+        logger.error(f"Could not register content {digest}, stored without deduplication")
+        return None
+
+    def release(self, digest: str) -> bool:
+        """Drop one reference; returns True when the caller must delete the stored file"""
+        doc = self.collection.find_one_and_update(
+            {"_id": digest},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            # Unknown content: other uploads may still share the file, keep it
+            logger.warning(f"No content entry for {digest}, leaving its stored file in place")
+            return False
+        if doc["refcount"] > 0:
+            return False
+        # Only delete if nobody took a new reference in the meantime
+        result = self.collection.delete_one({"_id": digest, "refcount": {"$lte": 0}})
+        return result.deleted_count == 1
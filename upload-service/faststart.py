@@ -0,0 +1,154 @@
+import os
+import uuid
+import struct
+import logging
+import threading
+from media_probe import ProbeError, read_box_header, iter_boxes, MAX_MOOV_BYTES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Boxes on the path from moov to the chunk offset tables
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+COPY_SIZE = 8 * 1024 * 1024
+
+# One rewrite per file at a time (deduplicated uploads share their file)
+_locks = {}
+_locks_lock = threading.Lock()
+
+class FaststartError(ProbeError):
+    """The file cannot be rewritten with moov first"""
+
+class _NeedCo64(Exception):
+    pass
+
+def _path_lock(path: str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(path, threading.Lock())
+
+def top_level_boxes(f, file_size: int) -> list:
+    """(type, offset, size) of every top-level box"""
+    boxes = []
+    offset = 0
+    while offset < file_size:
+        header = read_box_header(f, offset, file_size)
+        if header is None:
+            break
+        box_type, _, size = header
+        boxes.append((box_type, offset, size))
+        offset += size
+    return boxes
+
+def rebuild_moov(data: bytes, start: int, end: int, shift, co64: bool) -> bytes:
+    """Serialize boxes with their chunk offsets moved by shift(offset)
+
+    stco tables are upgraded to co64 when co64 is set; otherwise an offset
+    that no longer fits in 32 bits raises _NeedCo64.
+    """
+    out = bytearray()
+    for box_type, payload_start, payload_end in iter_boxes(data, start, end):
+        if box_type in CONTAINER_BOXES:
+            payload = rebuild_moov(data, payload_start, payload_end, shift, co64)
+        elif box_type in (b"stco", b"co64"):
+            count = struct.unpack_from(">I", data, payload_start + 4)[0]
+            width = "Q" if box_type == b"co64" else "I"
+            offsets = [shift(o) for o in struct.unpack_from(f">{count}{width}", data, payload_start + 8)]
+            if box_type == b"stco" and co64:
+                box_type, width = b"co64", "Q"
+            elif width == "I" and offsets and max(offsets) > 0xFFFFFFFF:
+                raise _NeedCo64()
+            payload = data[payload_start:payload_start + 8] + struct.pack(f">{count}{width}", *offsets)
+        else:
+            payload = data[payload_start:payload_end]
+        out += struct.pack(">I4s", 8 + len(payload), box_type)
+        out += payload
+    return bytes(out)
+
+def copy_range(src, dst, offset: int, length: int):
+    """Append length bytes of src at offset to dst, in the kernel where possible"""
+    end = offset + length
+    while offset < end:
+        n = min(COPY_SIZE, end - offset)
+        try:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), n, offset)
+        except (AttributeError, OSError):
+            src.seek(offset)
+            data = src.read(n)
+            dst.write(data)
+            copied = len(data)
+        if copied == 0:
+            raise FaststartError(f"Unexpected end of file at offset {offset}")
+        offset += copied
+
+def rewrite(path: str) -> bool:
+    """Move the moov box of an MP4/MOV file in front of its media data
+
+    The file is streamed into a temporary file next to it (only moov is
+    held in memory), with every stco/co64 chunk offset shifted by the new
+    position of the media data, and then swapped in with an atomic rename
+    so readers see either the old or the new file. Returns False when the
+    file already has moov first (or cannot be rewritten safely).
+    """
+    with _path_lock(path):
+        st = os.stat(path)
+        with open(path, "rb") as src:
+            boxes = top_level_boxes(src, st.st_size)
+            types = [box[0] for box in boxes]
+            if b"moov" not in types or b"mdat" not in types:
+                raise FaststartError("File has no moov or mdat box")
+            if types.count(b"moov") > 1 or b"moof" in types:
+                logger.info(f"Leaving fragmented or multi-moov file {path} unchanged")
+                return False
+            _, moov_offset, moov_size = boxes[types.index(b"moov")]
+            _, insert_at, _ = boxes[types.index(b"mdat")]
+            if moov_offset < insert_at:
+                return False
+            if moov_size > MAX_MOOV_BYTES:
+                raise FaststartError(f"moov box is too large ({moov_size} bytes)")
+            src.seek(moov_offset)
+            moov = src.read(moov_size)
+            if len(moov) != moov_size:
+                raise FaststartError("Truncated moov box")
+
+        moov_end = moov_offset + moov_size
+        new_moov = None
+        for co64 in (False, True):
+            new_size = len(rebuild_moov(moov, 0, len(moov), lambda o: o, co64))
+
+            def shift(o):
+                # Everything from the first mdat up to the old moov moves down by the new moov
+                if insert_at <= o < moov_offset:
+                    return o + new_size
+                if o >= moov_end:
+                    return o + new_size - moov_size
+                return o
+
+            try:
+                new_moov = rebuild_moov(moov, 0, len(moov), shift, co64)
+                break
+            except _NeedCo64:
+                logger.info(f"Chunk offsets of {path} exceed 32 bits, converting stco to co64")
+
+        directory, name = os.path.split(path)
+        temp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.faststart")
+        try:
+            with open(path, "rb") as src, open(temp_path, "wb", buffering=0) as dst:
+                for box_type, offset, size in boxes:
+                    if offset == insert_at:
+                        dst.write(new_moov)
+                    if box_type != b"moov":
+                        copy_range(src, dst, offset, size)
+                os.fchmod(dst.fileno(), st.st_mode & 0o777)
+                os.fsync(dst.fileno())
+            current = os.stat(path)
+            if (current.st_ino, current.st_size, current.st_mtime_ns) != (st.st_ino, st.st_size, st.st_mtime_ns):
+                raise FaststartError("File changed while it was being rewritten")
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+    logger.info(f"Rewrote {path} with moov first ({len(new_moov)} bytes moved)")
+    return True
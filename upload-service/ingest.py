@@ -0,0 +1,123 @@
+import os
+import hashlib
+import logging
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+READ_SIZE = int(os.environ.get("INGEST_READ_KB", "1024")) * 1024
+WRITE_BUFFER = int(os.environ.get("INGEST_WRITE_BUFFER_KB", "4096")) * 1024
+MAX_FIELD_SIZE = 64 * 1024  # text fields only, file data never stays in memory
+
+class IngestError(Exception):
+    """Upload rejected while parsing the request body"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+class StreamedFile:
+    """A file part written straight to the volume under a temporary name"""
+
+    def __init__(self, filename: str, content_type: str, final_path: str, stored_filename: str):
+        self.filename = filename
+        self.content_type = content_type
+        self.final_path = final_path
+        self.stored_filename = stored_filename
+        self.temp_path = os.path.join(os.path.dirname(final_path), f".{stored_filename}.part")
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.fh = open(self.temp_path, "wb", buffering=WRITE_BUFFER)
+
+    def write(self, data: bytes):
+        self.fh.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+
+    def finish(self):
+        """Flush to disk; the file stays under its temporary name until commit"""
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+        self.fh.close()
+
+    def commit(self):
+        """Atomically publish the file under its final name"""
+        if not self.fh.closed:
+            self.finish()
+        os.replace(self.temp_path, self.final_path)
+
+    def discard(self):
+        if not self.fh.closed:
+            self.fh.close()
+        for path in (self.temp_path, self.final_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error cleaning up '{path}': {e}")
+
+def ingest_multipart(stream, boundary: str, file_field: str, open_file, on_file=None, on_field=None):
+    """Parse a multipart/form-data body incrementally, streaming the file part to disk
+
+    open_file(filename, content_type) returns a StreamedFile, None to skip
+    the part, or raises IngestError. Returns (fields, files) where files are
+    the StreamedFiles of file_field in body order, finished but not yet
+    committed. With on_file, each complete file is handed to on_file instead
+    of being finished here, and is no longer cleaned up on errors. With
+    on_field, each complete text field is handed to on_field(name, value),
+    which may raise IngestError to reject the body before later parts.
+    """
+    decoder = MultipartDecoder(boundary.encode("latin-1"))
+    fields = {}
+    files = []
+    current = None  # StreamedFile, or [name, bytearray] for a text field, or None to skip
+    handed_off = 0
+    eof = False
+    try:
+        while True:
+            try:
+                event = decoder.next_event()
+            except ValueError as e:
+                raise IngestError(f"Malformed multipart body: {e}")
+            if isinstance(event, NeedData):
+                if eof:
+                    raise IngestError("Incomplete multipart body")
+                chunk = stream.read(READ_SIZE)
+                eof = not chunk
+                decoder.receive_data(chunk or None)
+                continue
+            if isinstance(event, Epilogue):
+                break
+            if isinstance(event, File):
+                if event.name == file_field and event.filename:
+                    current = open_file(event.filename, event.headers.get("Content-Type"))
+                    if current is not None:
+                        files.append(current)
+                else:
+                    current = None
+            elif isinstance(event, Field):
+                current = [event.name, bytearray()]
+            elif isinstance(event, Data):
+                if isinstance(current, StreamedFile):
+                    current.write(event.data)
+                    if not event.more_data:
+                        if on_file is None:
+                            current.finish()
+                        else:
+                            on_file(current)
+                            handed_off += 1
+                elif current is not None:
+                    current[1] += event.data
+                    if len(current[1]) > MAX_FIELD_SIZE:
+                        raise IngestError(f"Field '{current[0]}' is too large")
+                    if not event.more_data:
+                        fields[current[0]] = current[1].decode("utf-8", "replace")
+                        if on_field is not None:
+                            on_field(current[0], fields[current[0]])
+    except Exception:
+        for f in files[handed_off:]:
+            f.discard()
+        raise
+    return fields, files
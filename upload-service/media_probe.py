@@ -0,0 +1,165 @@
+import os
+import struct
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Top-level boxes that can start an ISO base media (MP4/MOV) file
+TOP_LEVEL_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pdin", b"uuid", b"meta", b"styp", b"sidx"}
+MAX_MOOV_BYTES = int(os.environ.get("PROBE_MAX_MOOV_MB", "64")) * 1024 * 1024
+
+class ProbeError(Exception):
+    """The file is not a readable MP4/MOV container"""
+
+def read_box_header(f, offset: int, file_size: int):
+    """(type, header size, box size) of the box at offset, or None at the end of the file"""
+    f.seek(offset)
+    header = f.read(8)
+    if len(header) < 8:
+        return None
+    size, box_type = struct.unpack(">I4s", header)
+    header_size = 8
+    if size == 1:
+        large = f.read(8)
+        if len(large) < 8:
+            raise ProbeError(f"Truncated {box_type!r} box header")
+        size = struct.unpack(">Q", large)[0]
+        header_size = 16
+    elif size == 0:
+        # Box runs to the end of the file
+        size = file_size - offset
+    if size < header_size:
+        raise ProbeError(f"Invalid size for {box_type!r} box at offset {offset}")
+    return box_type, header_size, size
+
+def iter_boxes(data: bytes, start: int = 0, end: int = None):
+    """(type, payload start, payload end) of the boxes in a buffer"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1 and offset + 16 <= end:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            break
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+def find_box(data: bytes, start: int, end: int, box_type: bytes):
+    for found, payload_start, payload_end in iter_boxes(data, start, end):
+        if found == box_type:
+            return payload_start, payload_end
+    return None
+
+def parse_mvhd(data: bytes, start: int):
+    """(timescale, duration) of the movie header"""
+    version = data[start]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", data, start + 20)
+        unknown = duration == 0xFFFFFFFFFFFFFFFF
+    else:
+        timescale, duration = struct.unpack_from(">II", data, start + 12)
+        unknown = duration == 0xFFFFFFFF
+    return timescale, None if unknown else duration
+
+def parse_tkhd(data: bytes, start: int):
+    """(width, height) of a track, from its 16.16 fixed point header fields"""
+    version = data[start]
+    # version/flags, times, track id, reserved, duration, reserved, layer, group, volume, reserved, matrix
+    offset = start + (88 if version == 1 else 76)
+    width, height = struct.unpack_from(">II", data, offset)
+    return width >> 16, height >> 16
+
+def parse_track(data: bytes, start: int, end: int) -> dict:
+    track = {}
+    tkhd = find_box(data, start, end, b"tkhd")
+    if tkhd:
+        track["width"], track["height"] = parse_tkhd(data, tkhd[0])
+    mdia = find_box(data, start, end, b"mdia")
+    if not mdia:
+        return track
+    hdlr = find_box(data, mdia[0], mdia[1], b"hdlr")
+    if hdlr:
+        # version/flags, pre_defined, then the handler type ("vide", "soun", ...)
+        track["handler"] = data[hdlr[0] + 8:hdlr[0] + 12].decode("latin-1")
+    minf = find_box(data, mdia[0], mdia[1], b"minf")
+    stbl = minf and find_box(data, minf[0], minf[1], b"stbl")
+    stsd = stbl and find_box(data, stbl[0], stbl[1], b"stsd")
+    if stsd and stsd[1] - stsd[0] >= 16:
+        # version/flags, entry count, then the first sample entry: size and format
+        track["codec"] = data[stsd[0] + 12:stsd[0] + 16].decode("latin-1").strip("\x00 ")
+    return track
+
+def parse_moov(data: bytes) -> dict:
+    info = {}
+    mvhd = find_box(data, 0, len(data), b"mvhd")
+    if mvhd is None:
+        raise ProbeError("moov box has no mvhd")
+    timescale, duration = parse_mvhd(data, mvhd[0])
+    if timescale and duration is not None:
+        info["duration"] = round(duration / timescale, 3)
+    for box_type, start, end in iter_boxes(data):
+        if box_type != b"trak":
+            continue
+        track = parse_track(data, start, end)
+        if track.get("handler") == "vide" and "video_codec" not in info:
+            info["width"] = track.get("width")
+            info["height"] = track.get("height")
+            info["video_codec"] = track.get("codec")
+        elif track.get("handler") == "soun" and "audio_codec" not in info:
+            info["audio_codec"] = track.get("codec")
+    return info
+
+def probe(path: str) -> dict:
+    """Container metadata of an MP4/MOV file, reading only its headers
+
+    Walks the top-level boxes by seeking over their payloads (the media
+    data in mdat is never read) and parses the moov box: duration from
+    mvhd, resolution from the video track's tkhd, codec fourccs from the
+    sample descriptions. Bitrate is the file size over the duration.
+    faststart tells whether moov comes before mdat.
+    """
+    file_size = os.path.getsize(path)
+    info = None
+    brand = None
+    mdat_offset = moov_offset = None
+    with open(path, "rb") as f:
+        offset = 0
+        while offset < file_size:
+            header = read_box_header(f, offset, file_size)
+            if header is None:
+                break
+            box_type, header_size, size = header
+            if offset == 0 and box_type not in TOP_LEVEL_BOXES:
+                raise ProbeError(f"Not an MP4/MOV file (first box {box_type!r})")
+            if box_type == b"ftyp":
+                brand = f.read(4).decode("latin-1").strip()
+            elif box_type == b"mdat" and mdat_offset is None:
+                mdat_offset = offset
+            elif box_type == b"moov":
+                if size - header_size > MAX_MOOV_BYTES:
+                    raise ProbeError(f"moov box is too large ({size} bytes)")
+                if offset + size > file_size:
+                    raise ProbeError("Truncated moov box")
+                moov_offset = offset
+                try:
+                    info = parse_moov(f.read(size - header_size))
+                except struct.error:
+                    raise ProbeError("Truncated box inside moov")
+            if info is not None and mdat_offset is not None:
+                break
+            offset += size
+    if info is None:
+        raise ProbeError("No moov box found")
+
+    info["container"] = "mov" if brand == "qt" else "mp4"
+    info["brand"] = brand
+    info["faststart"] = mdat_offset is None or moov_offset < mdat_offset
+    if info.get("duration"):
+        info["bitrate"] = int(file_size * 8 / info["duration"])
+    return info
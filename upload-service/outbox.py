@@ -0,0 +1,225 @@
+import uuid
+import random
+import threading
+import logging
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from pymongo import ReturnDocument
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CatalogOutbox:
+    """Delivers catalog notifications recorded in uploads_metadata
+
+    Each upload document carries a "catalog_outbox" sub-document written in
+    the same insert/update as the upload itself, so a notification exists
+    for every stored upload without a multi-document transaction. A
+    background dispatcher leases due entries in batches, sends them to the
+    catalog's batch endpoint over a keep-alive session and retries failures
+    with exponential backoff. Entries carry an idempotency key, so a
+    delivery that is retried after a lost response does not duplicate the
+    video.
+
+    Fields learned after the upload (e.g. the probed duration) are added
+    with attach(): they ride along with the create if it has not been sent
+    yet, or are sent as an update of the catalog video once it exists.
+    """
+
+    FIELD = "catalog_outbox"
+
+    def __init__(self, collection, create_url: str, batch_url: str, batch_size: int = 50, poll_interval: float = 2.0,
+                 lease_seconds: float = 60.0, base_delay: float = 2.0, max_delay: float = 300.0,
+                 connect_timeout: float = 2.0, read_timeout: float = 15.0):
+        self.collection = collection
+        self.create_url = create_url
+        self.batch_url = batch_url
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.http = requests.Session()
+        self.http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.delivered = 0
+        self.failures = 0
+
+    def entry(self, payload: dict) -> dict:
+        """Outbox sub-document to store with a new upload"""
+        return {
+            "state": "pending",
+            "idempotency_key": uuid.uuid4().hex,
+            "payload": payload,
+            "attempts": 0,
+            "next_attempt_at": datetime.utcnow(),
+            "lease_owner": None,
+            "lease_until": None
+        }
+
+    def notify(self):
+        """Wake the dispatcher after recording a new entry"""
+        self.wakeup.set()
+
+    def _due_filter(self, now: datetime) -> dict:
+        return {
+            f"{self.FIELD}.state": "pending",
+            f"{self.FIELD}.next_attempt_at": {"$lte": now},
+            "$or": [{f"{self.FIELD}.lease_until": None}, {f"{self.FIELD}.lease_until": {"$lt": now}}]
+        }
+
+    def _claim_batch(self) -> list:
+        """Lease up to batch_size due entries (safe with several upload service replicas)"""
+        now = datetime.utcnow()
+        due = self._due_filter(now)
+        ids = [doc["_id"] for doc in self.collection.find(due, {"_id": 1}).limit(self.batch_size)]
+        if not ids:
+            return []
+        owner = uuid.uuid4().hex
+        self.collection.update_many(
+            dict(due, _id={"$in": ids}),
+            {"$set": {f"{self.FIELD}.lease_owner": owner,
+                      f"{self.FIELD}.lease_until": now + timedelta(seconds=self.lease_seconds)}}
+        )
+        return list(self.collection.find({"_id": {"$in": ids}, f"{self.FIELD}.lease_owner": owner},
+                                         {self.FIELD: 1}))
+
+    def _payload(self, outbox: dict) -> dict:
+        return dict(outbox["payload"], **outbox.get("updates", {}))
+
+    def _delivered(self, doc, video_id, created: bool = True):
+        current = self.collection.find_one_and_update(
+            {"_id": doc["_id"]},
+            {"$set": {f"{self.FIELD}.state": "delivered",
+                      f"{self.FIELD}.delivered_at": datetime.utcnow(),
+                      f"{self.FIELD}.lease_until": None,
+                      "catalog_video_id": video_id}},
+            projection={self.FIELD: 1},
+            return_document=ReturnDocument.AFTER
+        )
+        # Fields attached while the create was in flight, or missing from a video created by an earlier attempt
+        updates = current and current[self.FIELD].get("updates", {})
+        if updates and video_id and (not created or updates != doc[self.FIELD].get("updates", {})):
+            self._update_video(video_id, updates)
+
+    def _update_video(self, video_id: str, fields: dict):
+        try:
+            response = self.http.put(f"{self.create_url.rstrip('/')}/{video_id}", json=fields, timeout=self.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            logger.error(f"Failed to update catalog video {video_id} with {list(fields)}: {e}")
+
+    def attach(self, upload_id, fields: dict):
+        """Add fields to the catalog video of an upload, before or after it is delivered"""
+        doc = self.collection.find_one_and_update(
+            {"_id": upload_id, self.FIELD: {"$exists": True}},
+            {"$set": {f"{self.FIELD}.updates.{k}": v for k, v in fields.items()}},
+            projection={self.FIELD: 1, "catalog_video_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        # Still pending (or in flight, see _delivered): the create will carry the fields
+        if doc and doc[self.FIELD]["state"] == "delivered" and doc.get("catalog_video_id"):
+            self._update_video(doc["catalog_video_id"], fields)
+
+    def _rejected(self, doc, error: str):
+        """The catalog refused the payload itself, retrying would not help"""
+        logger.error(f"Catalog rejected notification for upload {doc['_id']}: {error}")
+        self.collection.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {f"{self.FIELD}.state": "failed",
+                      f"{self.FIELD}.last_error": error,
+                      f"{self.FIELD}.lease_until": None}}
+        )
+
+    def _retry_later(self, doc, error: str):
+        attempts = doc[self.FIELD].get("attempts", 0) + 1
+        # Exponential backoff with jitter, capped; entries are never dropped
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+        self.collection.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {f"{self.FIELD}.attempts": attempts,
+                      f"{self.FIELD}.last_error": error,
+                      f"{self.FIELD}.next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+                      f"{self.FIELD}.lease_until": None}}
+        )
+
+    def _deliver_each(self, docs: list):
+        """One request per entry, for catalogs without the batch endpoint"""
+        for doc in docs:
+            outbox = doc[self.FIELD]
+            try:
+                response = self.http.post(self.create_url, json=self._payload(outbox), timeout=self.timeout,
+                                          headers={"Idempotency-Key": outbox["idempotency_key"]})
+                if response.status_code in (200, 201):
+                    self._delivered(doc, response.json().get("video_id"), created=response.status_code == 201)
+                    self.delivered += 1
+                elif 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                    self._rejected(doc, f"{response.status_code}: {response.text[:200]}")
+                else:
+                    raise requests.exceptions.HTTPError(f"{response.status_code} from catalog")
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Failed to deliver catalog notification for upload {doc['_id']}: {e}")
+                self._retry_later(doc, str(e))
+
+    def dispatch_once(self) -> int:
+        """Deliver one batch, returns the number of entries handled"""
+        docs = self._claim_batch()
+        if not docs:
+            return 0
+        videos = [dict(self._payload(doc[self.FIELD]), idempotency_key=doc[self.FIELD]["idempotency_key"]) for doc in docs]
+        try:
+            response = self.http.post(self.batch_url, json={"videos": videos}, timeout=self.timeout)
+            if response.status_code in (404, 501):
+                self._deliver_each(docs)
+                return len(docs)
+            if response.status_code >= 500 or response.status_code in (408, 429):
+                raise requests.exceptions.HTTPError(f"{response.status_code} from catalog")
+            if response.status_code >= 400:
+                for doc in docs:
+                    self._rejected(doc, f"{response.status_code}: {response.text[:200]}")
+                return len(docs)
+            results = response.json().get("results", [])
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to deliver {len(docs)} catalog notifications: {e}")
+            for doc in docs:
+                self._retry_later(doc, str(e))
+            return len(docs)
+
+        for doc, result in zip(docs, results):
+            if result.get("status") in ("created", "exists"):
+                self._delivered(doc, result.get("video_id"), created=result["status"] == "created")
+                self.delivered += 1
+            else:
+                self._rejected(doc, result.get("error") or "unknown error")
+        for doc in docs[len(results):]:
+            self._retry_later(doc, "missing from catalog response")
+        logger.info(f"Delivered {len(results)} catalog notifications")
+        return len(docs)
+
+    def _worker(self):
+        while True:
+            try:
+                # Keep going while full batches come back, then wait for new work
+                while self.dispatch_once() >= self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Catalog outbox dispatcher error: {e}")
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._worker, name="catalog-outbox", daemon=True)
+            self.thread.start()
+
+    def stats(self) -> dict:
+        return {"delivered": self.delivered, "failures": self.failures}
@@ -0,0 +1,23 @@
+import os
+import hashlib
+
+# Two levels of 256 directories: ab/cd/<filename>
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+def shard_dirs(filename: str) -> list:
+    """Subdirectories a stored file lives in, derived from a hash of its name"""
+    digest = hashlib.md5(filename.encode("utf-8")).hexdigest()
+    return [digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS)]
+
+def sharded_path(base_dir: str, filename: str) -> str:
+    """Location of a file in the hashed layout"""
+    return os.path.join(base_dir, *shard_dirs(filename), filename)
+
+def flat_path(base_dir: str, filename: str) -> str:
+    """Location of a file in the original flat layout"""
+    return os.path.join(base_dir, filename)
+
+def candidate_paths(base_dir: str, filename: str) -> list:
+    """Paths to try when reading a file while both layouts may be in use"""
+    return [sharded_path(base_dir, filename), flat_path(base_dir, filename)]